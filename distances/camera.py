@@ -3,15 +3,19 @@ import cv2
 import csv
 import shutil
 import pickle
+import numpy as np
 import matplotlib.pyplot as plt
 
 from tqdm import *
+from itertools import izip
+from multiprocessing import Pool
 from file_utils import get_paths
 from time_utils import format_time
 from time_utils import get_time_from_path
 from digit_classifier import load_model
 from digit_classifier import find_number
 from template_matching import get_templates 
+from template_matching import load_template_bank
 from template_matching import contains_tete_template
 from template_matching import contains_chequered_flag
 from template_matching import contains_group_positions
@@ -21,6 +25,12 @@ from template_matching import is_poursuivants_marker_frame
 from template_matching import is_tete_marker_frame 
 
 from file_utils import get_img_paths_in_dir
+from camera_log import CameraFeatureLog
+
+# Number of precis frames sent to a worker process at a time
+CHUNK_SIZE = 64
+# The template bank used by each worker process in parallel mode
+_WORKER_STATE = {}
 
 
 class Camera:
@@ -36,9 +46,11 @@ class Camera:
 
 class CameraFocus:
 
-    def __init__(self, root_path, stage_id):
+    def __init__(self, root_path, stage_id, rois=None):
         """takes as input a directory containing frames i.e. 
-        snapshots taken at a one second interval."""
+        snapshots taken at a one second interval. `rois` optionally
+        fixes the search region of each template (otherwise it is 
+        learned from the template's first confident match)."""
         self.paths = get_paths(root_path, stage_id)
         self.frames = sorted(get_img_paths_in_dir(self.paths['precis']))
         self.stage_id = stage_id
@@ -46,34 +58,150 @@ class CameraFocus:
         self.camera_states_log = []
         self.digit_model = load_model(self.paths)
         self.current_distance = None
-        self.templates = get_templates(self.paths)
+        self.template_bank = load_template_bank(self.paths, rois)
+        self.templates = self.template_bank.templates
         self.annotations = self.load_manual_annotations(self.paths)
 
-    def get_camera_states(self):
-        # First check if camera states log already exists
+    def get_camera_states(self, frames=None, workers=1):
+        """returns the camera state of each precis frame. `frames` 
+        can optionally be given as an iterator of (time, grayscale img)
+        pairs (e.g. decoded directly from the video), otherwise the 
+        precis frames are read from disk. If `workers` is greater than
+        one, the precis frames on disk are classified by a pool of 
+        worker processes, giving the same log as the serial scan.
+
+        The features of each frame are recorded in an incremental log
+        as they are computed, so only frames that are missing from it 
+        (e.g. after an interrupted run, or new frames, or frames whose
+        annotation has been removed) are classified. When `frames` is a
+        VideoFrames, only those frames are decoded."""
+        # Logs pickled before the incremental log existed are reused as is
         log_file = self.paths['log']
-        if os.path.isfile(log_file):
+        feature_file = self.paths['camera_features']
+        if os.path.isfile(log_file) and not os.path.isfile(feature_file):
             with open(log_file, 'rb') as f:
                 self.camera_states_log = pickle.load(f)
-        else:
-            # otherwise, create it from scratch
-            for img_name in tqdm(self.frames):
-                img = cv2.imread(img_name, cv2.CV_LOAD_IMAGE_GRAYSCALE) 
-                self.update_camera_state(img, img_name)
-                self.camera_states_log.append(self.current_camera_state)
+            return self.camera_states_log
+        feature_log = CameraFeatureLog(feature_file)
+        for name, roi in feature_log.rois().items():
+            self.template_bank.rois.setdefault(name, roi)
+        try:
+            if workers > 1 and frames is None:
+                times, labels = self.classify_frames_in_parallel(workers, feature_log)
+            else:
+                times, labels = self.classify_frames(frames, feature_log)
+        finally:
+            feature_log.save_rois(self.template_bank.rois)
+            feature_log.close()
+        self.current_camera_state = Camera.Rest
+        self.camera_states_log = []
+        for time, is_labeled in zip(times, labels):
+            self.apply_frame_features(time, is_labeled)
+            self.camera_states_log.append(self.current_camera_state)
         return self.camera_states_log
 
-
-    def update_camera_state(self, img, img_name):
+    def update_camera_state(self, img, time):
         # First check for manual annotations        
-        time = get_time_from_path(img_name)
-        if time in self.annotations.keys():
+        is_labeled = None
+        if time not in self.annotations:
+            is_labeled = self.is_distance_labeled(img)
+        self.apply_frame_features(time, is_labeled)
+
+    def apply_frame_features(self, time, is_labeled):
+        """updates the current camera state using the features of 
+        a single frame (whether it is annotated and whether it is 
+        distance labeled). Frames that are distance labeled keep the
+        current state, so this must be applied in time order."""
+        if time in self.annotations:
             self.update_annotated_state(time)
-        elif not self.is_distance_labeled(img):
+        elif not is_labeled:
             self.current_camera_state = Camera.Rest
         else:
             pass
 
+    def needs_classifying(self, time, known_labels):
+        """returns true if the frame at `time` is neither annotated
+        nor already recorded in the feature log."""
+        return time not in self.annotations and time not in known_labels
+
+    def classify_frames(self, frames, feature_log):
+        """returns the times of the frames, together with whether 
+        each frame is distance labeled (None for annotated frames, 
+        which are never classified). Frames that are not already in 
+        the feature log are classified and added to it. If `frames` 
+        can select its frames by time (see `VideoFrames.select`), only
+        those frames are decoded."""
+        if frames is None:
+            frames = [(get_time_from_path(img_path), img_path) for img_path in self.frames]
+        known_labels = feature_log.labels()
+        if hasattr(frames, 'select'):
+            frames = self.skip_logged_frames(frames, known_labels)
+        num_rois = len(self.template_bank.rois)
+        times, labels = [], []
+        for time, img in tqdm(frames):
+            is_labeled = known_labels.get(time)
+            if self.needs_classifying(time, known_labels):
+                if not isinstance(img, np.ndarray):
+                    img = cv2.imread(img, cv2.CV_LOAD_IMAGE_GRAYSCALE)
+                is_labeled = self.is_distance_labeled(img)
+                feature_log.add(time, is_labeled)
+                if len(self.template_bank.rois) != num_rois:
+                    feature_log.save_rois(self.template_bank.rois)
+                    num_rois = len(self.template_bank.rois)
+            times.append(time)
+            labels.append(is_labeled)
+        return (times, labels)
+
+    def skip_logged_frames(self, frames, known_labels):
+        """yields the (time, frame) pairs of the frame source `frames`,
+        where the frame is None for the times that do not need 
+        classifying, so that only the other frames are decoded."""
+        times = list(frames.times)
+        pending = [time for time in times if self.needs_classifying(time, known_labels)]
+        decoded = iter(frames.select(pending))
+        for time in times:
+            if self.needs_classifying(time, known_labels):
+                yield next(decoded)
+            else:
+                yield (time, None)
+
+    def classify_frames_in_parallel(self, workers, feature_log, chunk_size=CHUNK_SIZE):
+        """returns the times of the precis frames, together with 
+        whether each frame is distance labeled (None for annotated 
+        frames, which are never classified). Frames missing from the 
+        feature log are read from disk and classified in chunks by a 
+        pool of worker processes, and added to the log as each chunk
+        is completed."""
+        img_paths = self.frames
+        times = [get_time_from_path(img_path) for img_path in img_paths]
+        known_labels = feature_log.labels()
+        labels = [known_labels.get(time) for time in times]
+        pending = [i for i, time in enumerate(times) 
+                   if self.needs_classifying(time, known_labels)]
+        # the flag's search region is learned in order here first, so 
+        # that every worker searches the same region as the serial scan
+        while 'flag' not in self.template_bank.rois and pending:
+            idx = pending.pop(0)
+            img = cv2.imread(img_paths[idx], cv2.CV_LOAD_IMAGE_GRAYSCALE)
+            labels[idx] = self.is_distance_labeled(img)
+            feature_log.add(times[idx], labels[idx])
+        feature_log.save_rois(self.template_bank.rois)
+        chunks = [pending[i:i + chunk_size] for i in range(0, len(pending), chunk_size)]
+        chunk_paths = [[img_paths[i] for i in chunk] for chunk in chunks]
+        pool = Pool(processes=workers, initializer=init_classifier_worker,
+                    initargs=(self.paths, self.template_bank.rois))
+        try:
+            results = pool.imap(classify_frame_chunk, chunk_paths)
+            for chunk, chunk_labels in tqdm(izip(chunks, results), total=len(chunks)):
+                for i, is_labeled in zip(chunk, chunk_labels):
+                    labels[i] = is_labeled
+                    feature_log.add(times[i], is_labeled)
+                feature_log.commit()
+        finally:
+            pool.terminate()
+            pool.join()
+        return (times, labels)
+
     def update_annotated_state(self, time):
         if self.annotations[time] == 'T':
             self.current_camera_state = Camera.Tete
@@ -83,10 +211,7 @@ class CameraFocus:
     def is_distance_labeled(self, img):
         """returns true if the image contains BOTH a chequred flag 
         and the distance is measured in km."""
-        has_flag = contains_chequered_flag(img, self.templates['flag'])
-        if has_flag:
-            in_km = is_distance_measured_in_km(img, self.templates)
-        return has_flag and in_km
+        return self.template_bank.is_distance_labeled(img)
 
     def visualize(self, **kwargs):
         """plot a grap illustrating the camera focus 
@@ -113,5 +238,24 @@ class CameraFocus:
     def save_camera_states(self):
         """pickle the camera states so that they can be 
         retrieved later in processing."""
+        log_dir = os.path.dirname(self.paths['log'])
+        if not os.path.exists(log_dir):
+            os.makedirs(log_dir)
         with open(self.paths['log'], 'wb') as f:
             pickle.dump(self.camera_states_log, f)
+
+
+def init_classifier_worker(paths, rois):
+    """loads the templates once in each worker process, using 
+    the search regions already learned by the parent process."""
+    _WORKER_STATE['template_bank'] = load_template_bank(paths, rois)
+
+def classify_frame_chunk(img_paths):
+    """returns whether each of the given precis frames is 
+    distance labeled (run inside a worker process)."""
+    template_bank = _WORKER_STATE['template_bank']
+    labels = []
+    for img_path in img_paths:
+        img = cv2.imread(img_path, cv2.CV_LOAD_IMAGE_GRAYSCALE)
+        labels.append(template_bank.is_distance_labeled(img))
+    return labels
@@ -0,0 +1,65 @@
+import os
+import sqlite3
+
+# Number of classified frames written before the log is committed
+COMMIT_INTERVAL = 100
+REGION_KEYS = ['top_left_x', 'top_left_y', 'bottom_right_x', 'bottom_right_y']
+
+class CameraFeatureLog:
+    """An incremental store (backed by sqlite) of the per-frame 
+    features used to determine the camera state, keyed by frame time.
+    Frames are committed as they are classified, so an interrupted 
+    run can resume where it stopped, and only frames missing from 
+    the log ever need to be classified. The template search regions
+    are stored alongside so that a resumed run searches the same 
+    regions as the original."""
+
+    def __init__(self, path, commit_interval=COMMIT_INTERVAL):
+        log_dir = os.path.dirname(path)
+        if log_dir and not os.path.exists(log_dir):
+            os.makedirs(log_dir)
+        self.connection = sqlite3.connect(path)
+        self.commit_interval = commit_interval
+        self.num_pending = 0
+        self.connection.execute('CREATE TABLE IF NOT EXISTS frame_features '
+                                '(time TEXT PRIMARY KEY, is_labeled INTEGER NOT NULL)')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS template_rois '
+                                '(name TEXT PRIMARY KEY, top_left_x INTEGER, '
+                                'top_left_y INTEGER, bottom_right_x INTEGER, '
+                                'bottom_right_y INTEGER)')
+        self.connection.commit()
+
+    def labels(self):
+        """returns a dictionary mapping the time of each classified 
+        frame to whether it is distance labeled."""
+        rows = self.connection.execute('SELECT time, is_labeled FROM frame_features')
+        return dict((str(time), bool(is_labeled)) for time, is_labeled in rows)
+
+    def add(self, time, is_labeled):
+        """records whether the frame at `time` is distance labeled."""
+        self.connection.execute('INSERT OR REPLACE INTO frame_features VALUES (?, ?)',
+                                (time, int(is_labeled)))
+        self.num_pending = self.num_pending + 1
+        if self.num_pending >= self.commit_interval:
+            self.commit()
+
+    def rois(self):
+        """returns the stored template search regions."""
+        rows = self.connection.execute('SELECT * FROM template_rois')
+        return dict((str(row[0]), dict(zip(REGION_KEYS, row[1:]))) for row in rows)
+
+    def save_rois(self, rois):
+        """stores the given template search regions."""
+        for name, roi in rois.items():
+            values = [name] + [int(roi[key]) for key in REGION_KEYS]
+            self.connection.execute('INSERT OR REPLACE INTO template_rois '
+                                    'VALUES (?, ?, ?, ?, ?)', values)
+        self.commit()
+
+    def commit(self):
+        self.connection.commit()
+        self.num_pending = 0
+
+    def close(self):
+        self.commit()
+        self.connection.close()
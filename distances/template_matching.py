@@ -10,6 +10,9 @@ CONFIDENCE = 0.8
 # Define the width and height of the 'km to go' sign 
 SIGN_WIDTH = 200
 SIGN_HEIGHT = 20
+# Number of pixels of slack added around a template's first 
+# confident match to form its search region
+ROI_MARGIN = 10
 
 def contains_template(img, template, confidence):
     """returns true if the template mat1ching achieves the 
@@ -67,6 +70,11 @@ def find_top_left_corner(img, template):
     """returns the position of the top left corner of the 
     region bounded on the left by the location of the template."""
     match_val, match_pos = best_match(img, template)
+    return top_left_of_sign(match_pos, template)
+
+def top_left_of_sign(match_pos, template):
+    """returns the position of the top left corner of the region
+    bounded on the left by a template matched at `match_pos`."""
     top_left_sign = (match_pos[0] + template.shape[1], match_pos[1])
     return top_left_sign
 
@@ -75,6 +83,11 @@ def find_sign_location(img, template, width=SIGN_WIDTH, height=SIGN_HEIGHT):
     crop frame that encompasses the 'km to go' sign in the given region
     of specified dimeansions."""
     top_left_corner = find_top_left_corner(img, template)
+    return sign_location_from_corner(top_left_corner, width, height)
+
+def sign_location_from_corner(top_left_corner, width=SIGN_WIDTH, height=SIGN_HEIGHT):
+    """returns the bounding vertices of the 'km to go' sign 
+    whose top left corner is at the given position."""
     sign_location = {
         'top_left_x': top_left_corner[0],
         'top_left_y': top_left_corner[1],
@@ -152,3 +165,67 @@ def digit_region(img, templates, region_width=52):
                       'bottom_right_y': loc[1] + templates['km'].shape[0]}
     digits_frame = crop_frame(sign_frame, digit_location)
     return digits_frame
+
+class TemplateBank:
+    """Holds the templates returned by `get_templates` together with 
+    a fixed search region (ROI) for each template.  The overlays that 
+    the templates match are always drawn in the same place, so once a 
+    template has been found with confidence (or if its ROI is supplied
+    up front), later searches are restricted to that region rather 
+    than the full frame."""
+
+    def __init__(self, templates, rois=None, margin=ROI_MARGIN, confidence=CONFIDENCE):
+        self.templates = templates
+        self.rois = dict(rois) if rois else {}
+        self.margin = margin
+        self.confidence = confidence
+
+    def best_match(self, img, name):
+        """returns the maximum value and location (in the 
+        coordinates of `img`) of the best match for the named 
+        template, searching only its ROI if one is known."""
+        template = self.templates[name]
+        roi = self.rois.get(name)
+        if roi is None:
+            max_val, max_loc = best_match(img, template)
+            if max_val > self.confidence:
+                self.rois[name] = self.region_around(img, template, max_loc)
+            return (max_val, max_loc)
+        max_val, roi_loc = best_match(crop_frame(img, roi), template)
+        max_loc = (roi_loc[0] + roi['top_left_x'], roi_loc[1] + roi['top_left_y'])
+        return (max_val, max_loc)
+
+    def region_around(self, img, template, loc):
+        """returns the region of `img` covering a template matched
+        at `loc`, padded by the margin."""
+        rows, cols = img.shape[:2]
+        height, width = template.shape[:2]
+        region = {'top_left_x': max(loc[0] - self.margin, 0),
+                  'top_left_y': max(loc[1] - self.margin, 0),
+                  'bottom_right_x': min(loc[0] + width + self.margin, cols),
+                  'bottom_right_y': min(loc[1] + height + self.margin, rows)}
+        return region
+
+    def contains(self, img, name):
+        """returns true if the named template is found with
+        the required confidence."""
+        max_val, _ = self.best_match(img, name)
+        return max_val > self.confidence
+
+    def is_distance_labeled(self, img):
+        """returns true if the image contains BOTH a chequered flag
+        and the distance is measured in km. The location of the flag 
+        match is reused to find the sign, rather than matching the
+        flag a second time."""
+        max_val, flag_loc = self.best_match(img, 'flag')
+        if max_val <= self.confidence:
+            return False
+        top_left_corner = top_left_of_sign(flag_loc, self.templates['flag'])
+        sign_location = sign_location_from_corner(top_left_corner)
+        cropped_img = crop_frame(img, sign_location)
+        return contains_template(cropped_img, self.templates['km'], self.confidence)
+
+def load_template_bank(paths, rois=None):
+    """returns a TemplateBank holding the templates for 
+    the given paths, loaded once."""
+    return TemplateBank(get_templates(paths), rois=rois)
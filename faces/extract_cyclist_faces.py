@@ -1,44 +1,54 @@
 import os
+import cv2
 import dlib
 import matplotlib
-import csv
+import numpy as np
 from tqdm import *
-from skimage import io
+from multiprocessing import Pool
 from file_utils import get_paths
 from file_utils import get_jpgs_in_dir
+from snapshot_utils import snapshot_name
+from time_utils import times_to_milliseconds
+from time_utils import format_milliseconds
+from detection_store import make_detections
+from detection_store import save_detections
+from detection_store import face_name
 from image_utils import crop_frame
-from gradients import find_gradient
+from gradients import get_gradient_profile
 from template_matching import get_templates
 from digit_classifier import load_model
-from digit_classifier import find_number
+from distance_tracker import DistanceTracker
 
-# The primary cache used to store bounding boxes, times and gradients
-META_DATA = [] 
+# number of frames containing faces whose signs are read together
+OCR_BATCH_SIZE = 32
+# number of tete frames handed to a worker process at a time
+CHUNK_SIZE = 64
 
-def load_cache(paths):
+# items loaded once in each worker process (see `init_face_worker`)
+_WORKER_STATE = {}
+
+def load_cache(paths, gradient_profile=None):
     """load items that will be used repeatedly into memory
-    to avoid unnecessary IO."""
+    to avoid unnecessary IO. The gradient profile is loaded 
+    (or built) unless it is given."""
     cache = {}
     cache['paths'] = paths
     cache['model'] = load_model(paths)
     cache['detector'] = dlib.fhog_object_detector(paths['dlib_detector']) 
     cache['templates'] = get_templates(paths)
+    if gradient_profile is None:
+        gradient_profile = get_gradient_profile(paths)
+    cache['gradient_profile'] = gradient_profile
+    cache['distance_tracker'] = DistanceTracker(cache['model'], cache['templates'])
+    # gradients keyed by distance to go
+    cache['gradients'] = {}
     return cache
 
-def get_target_dir(target_dir):
-    """ensures that target_dir exists"""
-    if not os.path.exists(target_dir):
-        os.makedirs(target_dir)
-    return target_dir
-
-def save_meta_data(paths):
-    """saves the meta data associated with each image to 
-    file as a csv."""
-    with open(paths['meta'], 'wb') as f:
-        writer = csv.writer(f)
-        writer.writerow(['stage', 'time', 'bounding boxes', 'gradient'])
-        writer.writerows(META_DATA)
-        
+def save_meta_data(paths, records):
+    """saves the detections (`records`, one array per image) to
+    the stage's detection store, in time order."""
+    save_detections(paths['detections'], records)
+
 def get_bounding_boxes(dets):
     """returns a list of dictionaries containing
     the bounding vertices of each detection."""
@@ -51,35 +61,76 @@ def get_bounding_boxes(dets):
         bounding_boxes.append(bounding_box)
     return bounding_boxes
 
-def save_labeled_face(img_name, img, i, box, gradient, cache):
-    """Saves face `i` in `img` with a new filename that 
+def save_labeled_face(time_ms, face_img, i, gradient, cache):
+    """Saves the image of face `i` with a new filename that 
     includes the gradient at which the snapshot was taken."""
-    face_img = crop_frame(img, box)
     face_dims = face_img.shape
-    head, tail = os.path.split(img_name)
-    face_name = tail[:-4] + ':' + str(i) + ':' + str(gradient) + '.jpg'
+    time = format_milliseconds([time_ms])[0]
     if face_dims[0] > 10 and face_dims[1] > 10:
-        dest_dir = get_target_dir(cache['paths']['faces'])
-        matplotlib.image.imsave(dest_dir + face_name, face_img)
-
-def store_bounding_boxes(img_name, confident_boxes, gradient, cache):
-    """Saves the bounding boxes, times and gradients for each 
-    facae found"""
-    record = [cache['paths']['stage'], img_name[-16:-4], confident_boxes, gradient]
-    META_DATA.append(record)
-
-def extract_confident_detections(img, img_name, dets, scores, cache):
-    """For the given image, the gradient is calculated and
-    passed to 'save_labeled_face()' for detections 
-    that meet the required score threshold."""
-    distance_to_go = find_number(img_name, cache['paths'], cache['model'], cache['templates'])
-    gradient = find_gradient(cache['paths'], distance_to_go)
+        dest_dir = cache['paths'].ensure_dir(cache['paths']['faces'])
+        face_path = face_name(dest_dir, cache['paths']['stage'], time, i, gradient)
+        matplotlib.image.imsave(face_path, face_img)
+
+def frame_time(img_name):
+    """returns the time (HH:MM:SS:MMM) of the tete frame `img_name`."""
+    return img_name[-16:-4]
+
+def detection_records(time_ms, box_idxs, bounding_boxes, scores, gradient, cache):
+    """returns the detection store rows of the confident faces 
+    found in an image."""
+    boxes = [(box['top_left_x'], box['top_left_y'], 
+              box['bottom_right_x'], box['bottom_right_y']) for box in bounding_boxes]
+    return make_detections(cache['paths']['stage'], time_ms, box_idxs, boxes, 
+                           scores, gradient)
+
+def gradient_at(distance_to_go, cache):
+    """returns the gradient with `distance_to_go` km remaining,
+    looking it up only once for each distance (nan if the distance
+    has not been read yet)."""
+    if distance_to_go is None:
+        return np.nan
+    if distance_to_go not in cache['gradients']:
+        cache['gradients'][distance_to_go] = cache['gradient_profile'].gradient_at(distance_to_go)
+    return cache['gradients'][distance_to_go]
+
+def read_distances(regions, cache):
+    """returns the distance to go shown in each of the sign's digit
+    `regions`, given in time order. The distance tracker only runs 
+    OCR on the regions that have changed since the one before, and 
+    reuses the last reading for the others."""
+    return cache['distance_tracker'].read_regions(regions)
+
+def confident_faces(img, dets, scores):
+    """returns a list of (i, box, score, face_img) tuples for the 
+    detections that meet the required score threshold, where `i` is
+    the index of the box among all of the detections and `face_img`
+    is a copy of its crop of `img`."""
     bounding_boxes = get_bounding_boxes(dets)
-    for i, box in enumerate(bounding_boxes):
-            if scores[i] > 0.5:
-                save_labeled_face(img_name, img, i, box, gradient, cache)
-    confident_boxes = [pair[1] for pair in enumerate(bounding_boxes) if scores[pair[0]] > 0.5]
-    store_bounding_boxes(img_name, confident_boxes, gradient, cache)
+    return [(i, box, scores[i], crop_frame(img, box).copy())
+            for i, box in enumerate(bounding_boxes) if scores[i] > 0.5]
+
+def pending_detection(img_name, detection, cache):
+    """returns the parts of a detection needed once its sign has been
+    read: (img_name, region, faces), where `region` is the digit 
+    region of the sign and `faces` are its confident faces (see 
+    `confident_faces`). The full frame is not kept."""
+    frame, img, dets, scores = detection
+    region = cache['distance_tracker'].region(frame)
+    return (img_name, region, confident_faces(img, dets, scores))
+
+def extract_confident_detections(img_name, faces, cache, distance_to_go):
+    """For the given image, the gradient is calculated from the 
+    distance read from its sign and passed to 'save_labeled_face()' 
+    for each of its confident `faces`. Returns the detection store 
+    rows of the image, in which each box keeps its index among all 
+    of the detections (as used in its filename)."""
+    gradient = gradient_at(distance_to_go, cache)
+    time_ms = times_to_milliseconds([frame_time(img_name)])[0]
+    for i, box, score, face_img in faces:
+        save_labeled_face(time_ms, face_img, i, gradient, cache)
+    return detection_records(time_ms, [face[0] for face in faces], 
+                             [face[1] for face in faces],
+                             [face[2] for face in faces], gradient, cache)
 
 def faces_present(dets, scores, threshold):
     """returns true if the face detector found at 
@@ -87,17 +138,126 @@ def faces_present(dets, scores, threshold):
     more than 'threshold'."""
     return dets and max(scores) > threshold
 
-def extract_faces_from_image(img_name, cache, threshold=0.5):
-    img = io.imread(img_name)
+def detect_faces(img_name, cache, threshold=0.5, frame=None):
+    """returns a tuple (frame, img, dets, scores) for the faces 
+    detected in the image stored at `img_name`, or None if there 
+    are none. The image is decoded once into the bgr `frame` (which 
+    can also be given directly) and `img` is its rgb view."""
+    if frame is None:
+        frame = cv2.imread(img_name)
+    img = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
     dets, scores, idx = cache['detector'].run(img, 1)
     if faces_present(dets, scores, threshold):
-        extract_confident_detections(img, img_name, dets, scores, cache)
+        return (frame, img, dets, scores)
 
-def extract_face_frames(root_path, stage_id):
+def extract_faces_from_image(img_name, cache, threshold=0.5, frame=None):
+    """detects faces in the image stored at `img_name` and returns its
+    detection rows (or None if there are no faces). If a decoded 
+    bgr `frame` is given, it is used instead of reading the image."""
+    detection = detect_faces(img_name, cache, threshold, frame)
+    if detection:
+        img_name, region, faces = pending_detection(img_name, detection, cache)
+        distance_to_go, = read_distances([region], cache)
+        return extract_confident_detections(img_name, faces, cache, distance_to_go)
+
+def extract_pending_detections(pending, cache):
+    """reads the signs of all the `pending` detections (see 
+    `pending_detection`) in one batch and then extracts their 
+    confident detections, returning their detection rows."""
+    distances = read_distances([region for _, region, _ in pending], cache)
+    records = []
+    for (img_name, region, faces), distance_to_go in zip(pending, distances):
+        records.append(extract_confident_detections(img_name, faces, cache, 
+                                                    distance_to_go))
+    return records
+
+def extract_faces_in_batches(images, cache, threshold=0.5, batch_size=OCR_BATCH_SIZE):
+    """detects faces in each of the (img_name, frame) pairs in 
+    `images` (frame may be None), deferring the sign reading 
+    so that it is done for `batch_size` frames at a time (only the
+    sign regions and face crops are kept until then). Returns
+    the detection rows of the frames containing faces."""
+    records, pending = [], []
+    for img_name, frame in images:
+        detection = detect_faces(img_name, cache, threshold, frame)
+        if detection:
+            pending.append(pending_detection(img_name, detection, cache))
+        if len(pending) == batch_size:
+            records.extend(extract_pending_detections(pending, cache))
+            pending = []
+    if pending:
+        records.extend(extract_pending_detections(pending, cache))
+    return records
+
+def init_face_worker(paths, gradient_profile):
+    """loads the detector, model and templates once in each
+    worker process. The gradient profile is loaded by the parent,
+    so that the workers never build (and save) it concurrently."""
+    _WORKER_STATE['cache'] = load_cache(paths, gradient_profile)
+
+def extract_faces_from_chunk(img_names):
+    """returns the detection rows of the faces found in the 
+    given tete frames, together with the numbers of OCR calls 
+    made and skipped (run inside a worker process). The distance
+    tracker starts afresh for each chunk, so that the distances 
+    read do not depend on which chunks the worker handled before."""
+    cache = _WORKER_STATE['cache']
+    tracker = cache['distance_tracker']
+    tracker.reset()
+    ocr_calls, skipped = tracker.ocr_calls, tracker.skipped
+    images = [(img_name, None) for img_name in img_names]
+    records = extract_faces_in_batches(images, cache)
+    return (records, tracker.ocr_calls - ocr_calls, tracker.skipped - skipped)
+
+def extract_faces_in_parallel(paths, img_names, workers, chunk_size=CHUNK_SIZE):
+    """detects faces in the tete frames at `img_names` using a pool 
+    of `workers` processes, each of which handles chunks of 
+    `chunk_size` consecutive frames (in time order). Returns the 
+    detection rows."""
+    img_names = sorted(img_names)
+    chunks = [img_names[i:i + chunk_size] for i in range(0, len(img_names), chunk_size)]
+    gradient_profile = get_gradient_profile(paths)
+    pool = Pool(processes=workers, initializer=init_face_worker, 
+                initargs=(paths, gradient_profile))
+    try:
+        results = pool.imap_unordered(extract_faces_from_chunk, chunks)
+        # totals the OCR calls of the workers' trackers
+        tracker = DistanceTracker(model=None, templates=None)
+        records = []
+        for chunk_records, chunk_calls, chunk_skipped in tqdm(results, total=len(chunks)):
+            records.extend(chunk_records)
+            tracker.ocr_calls += chunk_calls
+            tracker.skipped += chunk_skipped
+    finally:
+        pool.terminate()
+        pool.join()
+    print(tracker.summary())
+    return records
+
+def tete_frame_names(paths):
+    """returns the paths of the stage's tete frames in time order
+    (the distance tracker relies on reading the frames in order)."""
+    root, jpgs = get_jpgs_in_dir(paths['tete'])
+    return sorted(root + jpg for jpg in jpgs)
+
+def extract_face_frames(root_path, stage_id, frames=None, workers=1):
+    """detects faces in each tete frame. `frames` can optionally
+    be given as an iterator of (time, bgr frame) pairs (e.g. decoded
+    directly from the video), otherwise the tete frames are read 
+    from disk, by a pool of processes if `workers` is greater than 
+    one. The detections are saved in time order."""
     paths = get_paths(root_path, stage_id)
+    if frames is None:
+        img_names = tete_frame_names(paths)
+        if workers > 1:
+            records = extract_faces_in_parallel(paths, img_names, workers)
+            save_meta_data(paths, records)
+            return
+        images = [(img_name, None) for img_name in img_names]
+    else:
+        images = ((snapshot_name(paths['tete'], stage_id, time), frame) 
+                  for time, frame in frames)
     cache = load_cache(paths)
-    root, jpgs = get_jpgs_in_dir(paths['tete'])
-    img_names = [root + jpg for jpg in jpgs]
-    for img_name in tqdm(img_names):
-        extract_faces_from_image(img_name, cache)
-    save_meta_data(paths)
+    records = extract_faces_in_batches(tqdm(images), cache)
+    print(cache['distance_tracker'].summary())
+    save_meta_data(paths, records)
@@ -1,11 +1,26 @@
 from __future__ import division
 
+import os
+import json
 import numpy as np
-from file_utils import get_paths
-from xml.dom import minidom
+import scipy_recipes
+from file_utils import get_paths, ensure_dir
+from xml.etree.cElementTree import iterparse
 
 ELEVATION_WINDOW_LENGTH = 25
 GRADIENT_WINDOW_LENGTH = 3
+GRADIENT_HALF_WIDTH = 8
+
+# maps the tags found within each tcx trackpoint to the
+# names under which their values are returned
+TRACKPOINT_FIELDS = {'AltitudeMeters': 'elevations',
+                     'DistanceMeters': 'distances',
+                     'LatitudeDegrees': 'latitudes',
+                     'LongitudeDegrees': 'longitudes',
+                     'Time': 'times'}
+
+# the most recently parsed tcx file (its 'path' and 'trackpoints')
+_TRACKPOINTS = {}
 
 
 def smooth(x, N):
@@ -17,23 +32,61 @@ def smooth(x, N):
     smoothed_x = np.convolve(x_complete, np.ones((N,))/N, mode='valid')
     return smoothed_x
 
+def local_name(tag):
+    """returns `tag` without its xml namespace."""
+    return tag.rsplit('}', 1)[-1]
+
+def parse_tcx(path):
+    """reads the trackpoints of the tcx file at `path` in a single 
+    streaming pass and returns a dictionary of arrays (keyed by the 
+    values of TRACKPOINT_FIELDS). Missing numeric values are nan."""
+    values = dict((name, []) for name in TRACKPOINT_FIELDS.values())
+    context = iterparse(path, events=('start', 'end'))
+    event, root = next(context)
+    # the open ancestors of the current element
+    parents = [root]
+    for event, elem in context:
+        if event == 'start':
+            parents.append(elem)
+            continue
+        parents.pop()
+        if local_name(elem.tag) != 'Trackpoint':
+            continue
+        point = dict((local_name(child.tag), child.text) for child in elem.iter())
+        for tag, name in TRACKPOINT_FIELDS.items():
+            value = point.get(tag)
+            if name != 'times':
+                value = float(value) if value is not None else np.nan
+            values[name].append(value)
+        # drop the processed trackpoint from its (still open) track
+        # and any finished siblings from the root
+        parents[-1].remove(elem)
+        root.clear()
+    trackpoints = dict((name, np.array(vals, dtype=float)) 
+                       for name, vals in values.items() if name != 'times')
+    trackpoints['times'] = np.array(values['times'], dtype=object)
+    return trackpoints
+
+def get_trackpoints(paths):
+    """returns the parsed trackpoints of the given stage, parsing
+    the tcx file only on first use. Only the most recent stage 
+    is kept."""
+    if _TRACKPOINTS.get('path') != paths['strava']:
+        _TRACKPOINTS.clear()
+        _TRACKPOINTS['trackpoints'] = parse_tcx(paths['strava'])
+        _TRACKPOINTS['path'] = paths['strava']
+    return _TRACKPOINTS['trackpoints']
+
 def get_xml_values(paths, target):
-    """returns the values contained in the dom nodes 
-    representing the xml data for the given stage_id.
-    `target` is used to select the data of interest."""
-    dom = minidom.parse(paths['strava'])
-    data_keys = {'elevations': 5, 'distances': 7}
-    data_id = data_keys[target]
-    values = []
-    for node in dom.getElementsByTagName('Trackpoint'):
-        values.append(node.childNodes[data_id].firstChild.nodeValue)
-    return values
+    """returns the array of values of the trackpoints in the tcx 
+    file of the given stage. `target` is used to select the data 
+    of interest (e.g. 'elevations' or 'distances')."""
+    return get_trackpoints(paths)[target]
 
 def get_elevations(paths):
     """returns a list of smoothed elevations for the given stage."""
     elevations = get_xml_values(paths, "elevations")
-    elevations = [float(elevation) for elevation in elevations]
-    smooth_elevations = smooth(np.array(elevations), N=ELEVATION_WINDOW_LENGTH)
+    smooth_elevations = smooth(elevations, N=ELEVATION_WINDOW_LENGTH)
     return smooth_elevations
 
 def get_precise_distances(paths):
@@ -42,47 +95,166 @@ def get_precise_distances(paths):
     producing accurate gradients. After this has been done, 
     the distances are converted to `km` for general use."""
     precise_distances = get_xml_values(paths, "distances")
-    precise_distances = [round(float(distance), 1) for distance in precise_distances]
+    precise_distances = [round(distance, 1) for distance in precise_distances]
     return precise_distances
 
-def calculate_gradients(elevations, distances):
-    """returns a list of gradients. These are calculated so 
+def round_values(values, decimals):
+    """rounds each of `values` to `decimals` places exactly as the 
+    builtin round does (np.round rounds ties to even and can 
+    misjudge values that only appear to be ties)."""
+    values = np.asarray(values, dtype=float)
+    rounded = np.round(values, decimals)
+    scaled = values * 10 ** decimals
+    near_tie = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    for idx in np.flatnonzero(near_tie):
+        rounded.flat[idx] = round(values.flat[idx], decimals)
+    return rounded
+
+def smooth_profiles(x, N, window=None):
+    """smooths `x` (a profile, or a 2D array with one profile per row)
+    with the flat `smooth` or, if `window` is given, with the 
+    windowed smooth from scipy_recipes."""
+    if window is None:
+        smooth_profile = lambda profile: smooth(profile, N)
+    elif N < 3:
+        smooth_profile = lambda profile: profile
+    else:
+        # the windowed output starts one sample before the profile
+        smooth_profile = lambda profile: scipy_recipes.smooth(profile, N, window)[1:]
+    if x.ndim == 1:
+        return smooth_profile(x)
+    return np.apply_along_axis(smooth_profile, -1, x)
+
+def calculate_gradients(elevations, distances, half_width=GRADIENT_HALF_WIDTH, window=None):
+    """returns an array of gradients. These are calculated so 
     that the gradient at marker n is estimated using the altitudes
-    of markers n - 6 and n + 6. The gradient for the first eight segments
-    are set to zero."""
-    gradients = 8 * [0]
-    for idx, elevation in enumerate(elevations):
-        if idx > 7 and idx < len(elevations) - 9:
-            distance = distances[idx + 8] - distances[idx - 8]
-            gradient = (elevations[idx + 8] - elevations[idx - 8]) / distance
-            gradients.append(gradient)
-    gradients.extend(8 * [0])
+    of markers n - half_width and n + half_width. The gradients 
+    for the first and last `half_width` segments are set to zero, so
+    profiles of fewer than 2 * half_width + 1 markers give 2 * half_width
+    zeros. Several profiles of the same length can be given as the rows
+    of 2D arrays. `window` selects the smoothing (see 
+    `smooth_profiles`)."""
+    elevations = np.asarray(elevations, dtype=float)
+    distances = np.asarray(distances, dtype=float)
+    num_markers = elevations.shape[-1]
+    stop = max(num_markers - 1, 2 * half_width)
+    rise = elevations[...,2 * half_width:stop] - elevations[...,:stop - 2 * half_width]
+    run = distances[...,2 * half_width:stop] - distances[...,:stop - 2 * half_width]
+    gradients = np.zeros(elevations.shape[:-1] + (stop,))
+    gradients[...,half_width:stop - half_width] = rise / run
     # convert gradients to percentages
-    gradients = [round(gradient * 100,1) for gradient in gradients] 
-    smooth_gradients = smooth(np.array(gradients), N = GRADIENT_WINDOW_LENGTH)
+    gradients = round_values(gradients * 100, 1)
+    smooth_gradients = smooth_profiles(gradients, GRADIENT_WINDOW_LENGTH, window)
     return smooth_gradients
 
+def closest_marker_index(distances, target_distance):
+    """returns the index of the first marker in the sorted array 
+    `distances` closest to `target_distance` (which may be an array),
+    using a binary search. Equidistant targets take the first marker."""
+    distances = np.asarray(distances)
+    right = np.searchsorted(distances, target_distance, side='left')
+    right = np.clip(right, 0, len(distances) - 1)
+    left = np.maximum(right - 1, 0)
+    left_gap = np.abs(distances[left] - target_distance)
+    right_gap = np.abs(distances[right] - target_distance)
+    closest = np.where(left_gap <= right_gap, distances[left], distances[right])
+    return np.searchsorted(distances, closest, side='left')
+
 def find_gradient_at_distance(target_distance, distances, gradients):
     """finds the gradient at the marker located closest to 
     the given target_distance.""" 
-    closest_marker = min(distances, key=lambda x:abs(x - target_distance)) 
-    closest_idx = distances.index(closest_marker)
+    closest_idx = closest_marker_index(distances, target_distance)
     # prevent indexing errors
     closest_idx = min(closest_idx, len(gradients) - 1) 
     return gradients[closest_idx]
 
-def find_gradient(paths, distance_to_go):
-    """calculates the gradient of the given stage with 
-    `distance_to_go` km remaining."""
-    print(paths['offset'])
-    distance_to_go = distance_to_go - paths['offset']
+class GradientProfile:
+    """Holds the gradient at each marker of a stage so that the 
+    gradient at any distance to go can be looked up without 
+    re-processing the gps data."""
+
+    def __init__(self, distances, gradients, offset, key=None):
+        """`distances` are the marker distances in km and `gradients` 
+        the rounded gradient at each of them. The markers are sorted by
+        distance if they are not already. `key` describes what the 
+        profile was built from (see `profile_key`)."""
+        self.distances = np.asarray(distances, dtype=float)
+        self.gradients = np.asarray(gradients, dtype=float)
+        if (np.diff(self.distances) < 0).any():
+            order = np.argsort(self.distances, kind='mergesort')
+            self.distances = self.distances[order]
+            self.gradients = self.gradients[order]
+        self.offset = offset
+        self.key = key
+
+    def gradient_at(self, distance_to_go):
+        """returns the gradient with `distance_to_go` km remaining.
+        `distance_to_go` may also be an array of distances."""
+        distance_to_go = np.asarray(distance_to_go, dtype=float) - self.offset
+        target_distance = self.distances[-1] - distance_to_go
+        gradients = self.gradients[closest_marker_index(self.distances, target_distance)]
+        if gradients.ndim == 0:
+            return float(gradients)
+        return gradients
+
+    def save(self, path):
+        """saves the profile to `path` (an .npz file). The offset
+        is not saved, as it comes from the stage calibrations."""
+        ensure_dir(os.path.dirname(path))
+        np.savez(path, distances=self.distances, gradients=self.gradients, 
+                 key=np.array(self.key or ''))
+
+def load_gradient_profile(path, offset):
+    """loads the GradientProfile saved at `path`. Profiles saved 
+    without a key are loaded with a key of None."""
+    data = np.load(path)
+    key = str(data['key']) if 'key' in data.files else None
+    return GradientProfile(data['distances'], data['gradients'], offset, key or None)
+
+def profile_key(paths, half_width=GRADIENT_HALF_WIDTH, window=None):
+    """returns a string describing the gps data (path and modification
+    time) and the parameters that the profile of the given stage is 
+    built from, so that stale saved profiles can be detected."""
+    source = paths['strava']
+    mtime = os.path.getmtime(source) if os.path.isfile(source) else None
+    return json.dumps({'source': source,
+                       'source_mtime': mtime,
+                       'elevation_window': ELEVATION_WINDOW_LENGTH,
+                       'gradient_window': GRADIENT_WINDOW_LENGTH,
+                       'half_width': half_width,
+                       'window': window}, sort_keys=True)
+
+def build_gradient_profile(paths, half_width=GRADIENT_HALF_WIDTH, window=None):
+    """computes the GradientProfile of the given stage from its 
+    gps data (see `calculate_gradients` for `half_width` and `window`)."""
     elevations = get_elevations(paths)    
     distances = get_precise_distances(paths)
-    gradients = calculate_gradients(elevations, distances)
+    gradients = calculate_gradients(elevations, distances, half_width, window)
 
     # convert from metres to km
     distances = [round(distance / 1000, 2) for distance in distances]
-    target_distance = max(distances) - distance_to_go
-    target_gradient = find_gradient_at_distance(target_distance, distances, gradients)
-    rounded_target = round(target_gradient, 1) 
-    return rounded_target 
+    # the final marker shares the gradient of the one before it
+    marker_gradients = [gradients[min(idx, len(gradients) - 1)] 
+                        for idx in range(len(distances))]
+    marker_gradients = [round(gradient, 1) for gradient in marker_gradients]
+    return GradientProfile(distances, marker_gradients, paths['offset'], 
+                           profile_key(paths, half_width, window))
+
+def get_gradient_profile(paths, half_width=GRADIENT_HALF_WIDTH, window=None):
+    """returns the GradientProfile of the given stage, building 
+    and saving it on first use. A saved profile is rebuilt when its 
+    gps data or build parameters have changed (it is used as saved 
+    if the gps data is no longer available)."""
+    if os.path.isfile(paths['gradient_profile']):
+        profile = load_gradient_profile(paths['gradient_profile'], paths['offset'])
+        key = profile_key(paths, half_width, window)
+        if profile.key == key or not os.path.isfile(paths['strava']):
+            return profile
+    profile = build_gradient_profile(paths, half_width, window)
+    profile.save(paths['gradient_profile'])
+    return profile
+
+def find_gradient(paths, distance_to_go):
+    """calculates the gradient of the given stage with 
+    `distance_to_go` km remaining."""
+    return get_gradient_profile(paths).gradient_at(distance_to_go)
@@ -4,70 +4,168 @@ import numpy as np
 from matplotlib import pyplot as plt
 import matplotlib.patches as patches
 
+from file_utils import ensure_dir
 from image_utils import SIGN_WIDTH, SIGN_HEIGHT
 from image_utils import top_border, crop_frame, find_contours
 from image_utils import border_rectangle, get_fig_dimensions
-from image_utils import apply_threshold_to_image
-from image_utils import white_divider
+from image_utils import threshold_image, render_digit_region
+from image_utils import white_divider, FIGURE_DPI
 from template_matching import get_templates, digit_region
 
-def load_model(paths):
+# the compiled model is a single float32 array: a header row 
+# [MODEL_VERSION, num_samples, num_features] followed by one row 
+# per sample with its response in the final column
+MODEL_VERSION = 1
+COMPILED_MODEL = 'tdf_digit_model.npy'
+
+def save_model(paths, samples, responses):
+    """saves the training samples and responses as a compiled
+    (memory mappable) model."""
+    samples = np.float32(samples)
+    num_samples, num_features = samples.shape
+    model = np.zeros((num_samples + 1, num_features + 1), np.float32)
+    model[0,:3] = [MODEL_VERSION, num_samples, num_features]
+    model[1:,:-1] = samples
+    model[1:,-1] = np.ravel(responses)
+    np.save(ensure_dir(paths['digit_model']) + COMPILED_MODEL, model)
+
+def load_compiled_model(path):
+    """returns the (samples, responses) stored in the compiled
+    model at `path`."""
+    model = np.load(path, mmap_mode='r')
+    version, num_samples, num_features = model[0,:3]
+    if version != MODEL_VERSION:
+        raise ValueError('Unsupported digit model version: %d' % version)
+    samples = model[1:int(num_samples) + 1,:int(num_features)]
+    responses = model[1:int(num_samples) + 1,-1:]
+    return (samples, responses)
+
+def load_model_data(paths):
+    """returns the (samples, responses) used to train the model,
+    preferring the compiled model over the text files."""
+    compiled_path = paths['digit_model'] + COMPILED_MODEL
+    if os.path.isfile(compiled_path):
+        return load_compiled_model(compiled_path)
     samples = np.loadtxt(paths['digit_model'] + 'tdf_digit_samples.data', np.float32)
     responses = np.loadtxt(paths['digit_model'] + 'tdf_digit_responses.data', np.float32)
     responses = responses.reshape((responses.size,1))
+    return (samples, responses)
+
+def compile_model(paths):
+    """converts the text model files into a compiled model."""
+    samples, responses = load_model_data(paths)
+    save_model(paths, samples, responses)
+
+def load_model(paths):
+    samples, responses = load_model_data(paths)
+    samples = np.ascontiguousarray(samples, np.float32)
+    responses = np.ascontiguousarray(responses, np.float32)
     model = cv2.KNearest()
     model.train(samples, responses)
     return model
 
 def create_test_fig(km_img, top, rectangle, divider, paths):
+    """saves the matplotlib figure that `render_digit_region`
+    reproduces in memory (useful for inspecting the OCR input)."""
     fig_width, fig_height = get_fig_dimensions(SIGN_WIDTH, SIGN_HEIGHT)
     fig, ax = plt.subplots(1,1)
     fig.set_size_inches(fig_width, fig_height)
     fig.subplots_adjust(hspace=0, wspace=0)
-    ax.imshow(km_img, cmap = plt.cm.Greys_r)
+    ax.imshow(km_img, cmap = plt.cm.Greys_r, interpolation='bilinear')
     ax.add_patch(patches.Rectangle(**top))
     ax.add_patch(patches.Rectangle(**divider))
     ax.add_patch(patches.Rectangle(**rectangle))
     ax.set_axis_off()
-    plt.savefig(paths['test_figures'] + 'current_fig.jpg', bbox_inches='tight', pad_inches=0)
+    plt.savefig(ensure_dir(paths['test_figures']) + 'current_fig.jpg', bbox_inches='tight', 
+                pad_inches=0, dpi=FIGURE_DPI)
     plt.close("all")
 
+def load_grayscale(img):
+    """returns a grayscale version of `img`, which can be either 
+    the path to an image file or an already decoded (bgr or 
+    grayscale) frame."""
+    if isinstance(img, np.ndarray):
+        if img.ndim == 3:
+            img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        return img
+    gray_img = cv2.imread(img, cv2.IMREAD_GRAYSCALE)
+    if gray_img is None:
+        raise ValueError('Image not found')
+    return gray_img
+
 def preprocess(img_path, paths, templates):
     """Crops the original image so that it only contains the 'km to go'
-    sign and adds a grey border to help with digit classification. This 
-    is saved to file rather than passed around """
-    img = cv2.imread(img_path, cv2.IMREAD_GRAYSCALE)
-    if img is None:
-        raise ValueError('Image not found')
+    sign and adds a grey border to help with digit classification. The
+    bordered image is rendered in memory, so concurrent calls do not 
+    interfere. `img_path` may also be a decoded frame."""
+    img = load_grayscale(img_path)
     km_img = digit_region(img, templates)
+    return render_region(km_img)
+
+def render_region(km_img):
+    """adds the grey border, top bar and divider to the cropped 
+    digit region `km_img`."""
     top = top_border(km_img)
     divider = white_divider(km_img)
     rectangle = border_rectangle(km_img)
-    create_test_fig(km_img, top, rectangle, divider, paths)
+    return render_digit_region(km_img, [top, divider, rectangle])
 
-def classify(img_path, paths, model, templates):
-    """Apply kNN with k = 1 to categorize each digit in the image."""
-    preprocess(img_path, paths, templates)
-    binary_img = apply_threshold_to_image(paths['test_figures'] + 'current_fig.jpg')
-    plt.imshow(binary_img)
-    
+def extract_digit_rois(binary_img):
+    """returns a tuple (rois, contours) where `rois` is a float32
+    array with one flattened 40x40 row for each digit shaped contour 
+    found in the binary image."""
     contours = find_contours(binary_img)
-    final_contours, final_results = [],[]
+    digit_contours, rois = [],[]
     for contour in contours:
         if 100 < cv2.contourArea(contour) < 4000:
             [x, y, w, h] = cv2.boundingRect(contour)
             if h > 38 and (w > 10 and w < 50):
-                # cv2.rectangle(test_img, (x,y), (x+w, y+h), (255,0,0), 2)
                 roi = binary_img[y:y+h, x:x+w]
                 roi_small = cv2.resize(roi, (40,40))
-                roi_small = roi_small.reshape((1,-1))
-                roi_small = np.float32(roi_small)
-                retval, results, neigh_resp, dists = model.find_nearest(roi_small, k = 3)
-                final_contours.append(contour)
-                final_results.append(results[0][0])
-    plt.close()
+                rois.append(roi_small.reshape(-1))
+                digit_contours.append(contour)
+    rois = np.float32(rois).reshape((len(rois), 1600))
+    return (rois, digit_contours)
+
+def nearest_digits(rois, model):
+    """classifies every row of `rois` with a single kNN (k = 3) 
+    pass and returns the digits as a list."""
+    if not len(rois):
+        return []
+    retval, results, neigh_resp, dists = model.find_nearest(rois, k = 3)
+    return list(results[:,0])
+
+def classify(img_path, paths, model, templates):
+    """Apply kNN with k = 3 to categorize each digit in the image."""
+    binary_img = threshold_image(preprocess(img_path, paths, templates))
+    rois, final_contours = extract_digit_rois(binary_img)
+    final_results = nearest_digits(rois, model)
     return (final_results, final_contours)
 
+def classify_batch(img_paths, paths, model, templates):
+    """classifies the digits of every image in `img_paths` (paths
+    or decoded frames) with one kNN pass over all of their 
+    rois. Returns a list of (results, contours) tuples, one per 
+    image."""
+    rendered = [preprocess(img_path, paths, templates) for img_path in img_paths]
+    return classify_rendered(rendered, model)
+
+def classify_rendered(rendered, model):
+    """classifies the digits of each of the `rendered` digit regions
+    (see `render_region`) with one kNN pass over all of their rois.
+    Returns a list of (results, contours) tuples, one per region."""
+    all_rois, all_contours, counts = [],[],[]
+    for rendered_img in rendered:
+        binary_img = threshold_image(rendered_img)
+        rois, contours = extract_digit_rois(binary_img)
+        all_rois.append(rois)
+        all_contours.append(contours)
+        counts.append(len(contours))
+    results = nearest_digits(np.vstack(all_rois), model) if all_rois else []
+    bounds = np.cumsum([0] + counts)
+    return [(results[start:stop], contours) for start, stop, contours 
+            in zip(bounds[:-1], bounds[1:], all_contours)]
+
 def arrange_digits_in_order(digits, contours):
     digit_positions = []
     for contour, digit in zip(contours, digits):
@@ -76,11 +174,30 @@ def arrange_digits_in_order(digits, contours):
     sorted_positions = sorted(digit_positions, key=lambda x: x[0])
     return [pair[1] for pair in sorted_positions]
 
-def find_number(img_path, paths, model, templates):
-    final_results, final_contours = classify(img_path, paths, model, templates)
-    ordered_digits = arrange_digits_in_order(final_results, final_contours)
+def digits_to_number(ordered_digits):
+    """converts the ordered digits (the last of which follows 
+    the decimal point) into a distance."""
     total = 0.0    
     for i, digit in enumerate(reversed(ordered_digits)):
         total += digit * 10 ** (i - 1)
     total = round(total,1) # round to one decimal place
     return total
+
+def find_number(img_path, paths, model, templates):
+    final_results, final_contours = classify(img_path, paths, model, templates)
+    ordered_digits = arrange_digits_in_order(final_results, final_contours)
+    return digits_to_number(ordered_digits)
+
+def find_numbers(img_paths, paths, model, templates):
+    """returns the distance shown in each of the images in 
+    `img_paths`, classifying all of their digits at once."""
+    classified = classify_batch(img_paths, paths, model, templates)
+    return [digits_to_number(arrange_digits_in_order(results, contours))
+            for results, contours in classified]
+
+def find_numbers_in_regions(km_imgs, model):
+    """returns the distance shown in each of the cropped digit 
+    regions `km_imgs`, classifying all of their digits at once."""
+    classified = classify_rendered([render_region(km_img) for km_img in km_imgs], model)
+    return [digits_to_number(arrange_digits_in_order(results, contours))
+            for results, contours in classified]
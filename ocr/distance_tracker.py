@@ -0,0 +1,107 @@
+import numpy as np
+
+from digit_classifier import load_grayscale
+from digit_classifier import find_numbers_in_regions
+from template_matching import digit_region
+
+# mean absolute difference (in grey levels) below which two digit
+# regions are treated as showing the same sign
+MAX_REGION_DIFF = 4.0
+# the largest increase (in km) accepted between consecutive readings
+MAX_INCREASE = 0.1
+# the largest decrease (in km) accepted between consecutive readings
+# (a misread that drops a digit falls much further)
+MAX_DECREASE = 1.0
+# the number of consecutive rejected readings after which the tracker
+# accepts the new reading (so a misread cannot stall it)
+MAX_REJECTIONS = 3
+
+class DistanceTracker:
+    """Reads the distance to go from a sequence of frames (in time
+    order), re-running OCR only when the digit region differs from
+    that of the last frame that was read. Readings that increase the
+    distance to go, or drop it by more than MAX_DECREASE, are rejected
+    as misreads."""
+
+    def __init__(self, model, templates, max_diff=MAX_REGION_DIFF):
+        self.model = model
+        self.templates = templates
+        self.max_diff = max_diff
+        self.ocr_calls = 0
+        self.skipped = 0
+        self.reset()
+
+    def reset(self):
+        """forgets the last region and distance read (but not the 
+        counts of OCR calls), e.g. before reading frames that do 
+        not follow on from those read so far."""
+        self.last_region = None
+        self.distance = None
+        self.num_rejected = 0
+
+    def region_matches(self, region):
+        """returns true if `region` shows the same pixels (up to
+        `max_diff`) as the region that was last read."""
+        if self.last_region is None or region.shape != self.last_region.shape:
+            return False
+        diff = np.abs(np.int16(region) - np.int16(self.last_region))
+        return diff.mean() <= self.max_diff
+
+    def follows(self, reading):
+        """returns true if `reading` is a plausible successor of the 
+        distance to go that was last kept."""
+        change = reading - self.distance
+        return -MAX_DECREASE <= change <= MAX_INCREASE
+
+    def accept(self, reading):
+        """applies the monotonic decrease filter to `reading` and
+        returns the distance to go that is kept. Empty readings (no
+        digits were found, so the reading is 0.0) are ignored."""
+        if not reading:
+            return self.distance
+        if self.distance is not None and not self.follows(reading):
+            self.num_rejected += 1
+            if self.num_rejected <= MAX_REJECTIONS:
+                return self.distance
+        self.num_rejected = 0
+        self.distance = reading
+        return reading
+
+    def region(self, frame):
+        """returns (a copy of) the digit region of the sign in `frame`
+        (a path or decoded frame)."""
+        return digit_region(load_grayscale(frame), self.templates).copy()
+
+    def read(self, frames):
+        """returns the distance to go shown in each of `frames` (paths
+        or decoded frames, in time order)."""
+        return self.read_regions([self.region(frame) for frame in frames])
+
+    def read_regions(self, regions):
+        """returns the distance to go shown in each of the digit 
+        `regions` (in time order). The regions that changed are read
+        together in a single batch."""
+        previous = self.distance
+        pending, sources = [], []
+        for region in regions:
+            if self.region_matches(region):
+                self.skipped += 1
+            else:
+                self.last_region = region
+                pending.append(region)
+            # each frame takes the reading of the latest changed region
+            sources.append(len(pending) - 1)
+        readings = self.find_numbers(pending)
+        self.ocr_calls += len(pending)
+        distances = [self.accept(reading) for reading in readings]
+        return [distances[idx] if idx >= 0 else previous for idx in sources]
+
+    def find_numbers(self, regions):
+        """returns the distance read by OCR from each of the digit
+        `regions`."""
+        return find_numbers_in_regions(regions, self.model)
+
+    def summary(self):
+        """returns a description of the number of OCR calls made
+        and skipped."""
+        return 'OCR calls: %d, skipped: %d' % (self.ocr_calls, self.skipped)
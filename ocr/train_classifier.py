@@ -7,6 +7,7 @@ import matplotlib.patches as patches
 from collections import Counter
 
 from file_utils import get_jpgs_in_dir
+from file_utils import ensure_dir
 from image_utils import get_fig_dimensions
 from image_utils import crop_frame
 from image_utils import top_border
@@ -17,6 +18,7 @@ from image_utils import apply_threshold_to_image
 from template_matching import get_templates
 from template_matching import digit_region
 from template_matching import SIGN_WIDTH, SIGN_HEIGHT
+from digit_classifier import save_model
 
 def count_digits(file_list):
     """counts the instances of digits occuring 
@@ -81,7 +83,7 @@ def construct_training_image(paths, num_cols=3):
         ax.add_patch(patches.Rectangle(**top))
         ax.set_axis_off()
     fig.subplots_adjust(hspace=0.1)
-    plt.savefig(paths['fused'] + 'digit_examples.jpg', bbox_inches='tight', pad_inches=0)
+    plt.savefig(ensure_dir(paths['fused']) + 'digit_examples.jpg', bbox_inches='tight', pad_inches=0)
 
 def manually_label_digits(paths):
     """returns a tuple containing:
@@ -118,5 +120,7 @@ def save_model_labels(paths):
     responses = np.array(responses,np.float32)
     responses = responses.reshape((responses.size,1))
     print("labelling complete")
+    ensure_dir(paths['digit_model'])
     np.savetxt(paths['digit_model'] + 'tdf_digit_samples.data',samples)
     np.savetxt(paths['digit_model'] + 'tdf_digit_responses.data',responses)
+    save_model(paths, samples, responses)
@@ -1,50 +1,202 @@
+import os
 import csv
 import cv2
 import numpy as np
 from datetime import datetime
 from cycling.utils.file_utils import get_img_paths_in_dir, get_paths
 from cycling.utils.time_utils import get_time_from_path
+from cycling.utils.time_utils import times_to_milliseconds
 
 # Define the minimum number of seconds between 
 MIN_SHOT_LENGTH = 4 
+# chi-square histogram distance above which frames are from different shots
+CHI_SQUARE_THRESHOLD = 5
+# number of bins per colour channel in the frame histograms
+HIST_BINS = 16
+# number of frames histogrammed together by the batch functions
+BLOCK_SIZE = 256
 
-def save_boundaries(root_path, stage_id):
+def save_boundaries(root_path, stage_id, frames=None):
     """saves the shot boundaries data associated with a specific
-    stage as a csv."""
+    stage as a csv. `frames` can optionally be given as an iterator 
+    of (time, bgr frame) pairs (e.g. decoded directly from the video),
+    otherwise the dense tete frames are read from disk."""
     paths = get_paths(root_path, stage_id)
-    img_paths = sorted(get_img_paths_in_dir(paths['dense_tete']))
-    shot_boundaries = find_boundaries(img_paths)
+    if frames is None:
+        img_paths = sorted(get_img_paths_in_dir(paths['dense_tete']))
+        shot_boundaries = find_boundaries(img_paths)
+    else:
+        shot_boundaries = find_boundaries_in_frames(frames)
 
+    write_boundaries(paths, shot_boundaries)
+
+def write_boundaries(paths, shot_boundaries):
+    """writes the shot boundaries of a stage to its csv."""
+    paths.ensure_dir(os.path.dirname(paths['shot_boundaries']))
     with open(paths['shot_boundaries'], 'wb') as f:
         writer = csv.writer(f)
         for boundary in shot_boundaries:        
             writer.writerow([boundary])
 
+def save_frame_distances(root_path, stage_id, frames=None, downscale=1):
+    """computes and saves the histogram distance between each pair
+    of consecutive frames of a stage (see `save_boundaries` for 
+    `frames`), so that boundaries can be found for different 
+    thresholds without recomputing the histograms. The `downscale`
+    used is saved with the distances."""
+    paths = get_paths(root_path, stage_id)
+    if frames is None:
+        img_paths = sorted(get_img_paths_in_dir(paths['dense_tete']))
+        frames = read_frames(img_paths)
+    times, distances = find_frame_distances(frames, downscale)
+    paths.ensure_dir(os.path.dirname(paths['shot_distances']))
+    np.savez(paths['shot_distances'], times=times, distances=distances, 
+             downscale=downscale)
+    return (times, distances)
+
+def save_boundaries_from_distances(root_path, stage_id, threshold=CHI_SQUARE_THRESHOLD, 
+                                   downscale=1):
+    """saves the shot boundaries of a stage found from the frame
+    distances stored by `save_frame_distances`. `downscale` is the
+    one that `threshold` was chosen for (CHI_SQUARE_THRESHOLD was 
+    chosen for full resolution frames): distances computed with
+    another downscale are refused."""
+    paths = get_paths(root_path, stage_id)
+    data = np.load(paths['shot_distances'])
+    saved_downscale = int(data['downscale']) if 'downscale' in data.files else None
+    if saved_downscale != downscale:
+        raise ValueError('Distances were computed with a downscale of %s, not %d' 
+                         % (saved_downscale, downscale))
+    times, distances = list(data['times']), data['distances']
+    shot_boundaries = boundaries_from_distances(times, distances, threshold)
+    write_boundaries(paths, shot_boundaries)
+
 def get_hist(img_path):
     """returns a normalized, flattened colour histogram of the 
     image specified."""
     img = cv2.imread(img_path)
+    return calc_hist(img)
+
+def calc_hist(img):
+    """returns a normalized, flattened colour histogram of the 
+    decoded (bgr) image."""
     color_hist = cv2.calcHist(images=[img], channels=[0,1,2], mask=None,
             histSize=[16, 16, 16], ranges=[0, 256, 0, 256, 0, 256])
     hist = cv2.normalize(color_hist).flatten()
     return hist
 
+def calc_hists(frames, downscale=1):
+    """returns an array holding the normalized, flattened colour 
+    histogram of each of the decoded (bgr) `frames` (an array of 
+    shape (N, height, width, 3)), using only every `downscale`-th 
+    row and column. The bins match those of `calc_hist`."""
+    frames = np.asarray(frames)[:, ::downscale, ::downscale]
+    num_frames = frames.shape[0]
+    bins = (frames >> 4).astype(np.intp)
+    idx = (bins[...,0] * HIST_BINS + bins[...,1]) * HIST_BINS + bins[...,2]
+    num_bins = HIST_BINS ** 3
+    offsets = np.arange(num_frames)[:, np.newaxis] * num_bins
+    flat_idx = (idx.reshape((num_frames, -1)) + offsets).ravel()
+    counts = np.bincount(flat_idx, minlength=num_frames * num_bins)
+    hists = counts.reshape((num_frames, num_bins)).astype(np.float32)
+    norms = np.sqrt(np.square(hists).sum(axis=1))
+    return hists / norms[:, np.newaxis]
+
+def chi_square_distances(hists):
+    """returns the chi-square distance (as computed by compareHist)
+    between each pair of consecutive rows of `hists`."""
+    prev, now = hists[:-1].astype(np.float64), hists[1:].astype(np.float64)
+    valid = np.abs(prev) > np.finfo(np.float64).eps
+    terms = np.square(prev - now) / np.where(valid, prev, 1)
+    return np.where(valid, terms, 0).sum(axis=1)
+
+def find_frame_distances(frames, downscale=1, block_size=BLOCK_SIZE):
+    """returns a tuple (times, distances) for `frames`, an iterator 
+    of (time, bgr frame) pairs, where distances[i] is the chi-square
+    distance between the histograms of frames i and i + 1. Frames 
+    are histogrammed in blocks of `block_size`, holding only every 
+    `downscale`-th row and column of each frame."""
+    times, distances = [], []
+    hist_prev = None
+    block = []
+    for time, frame in frames:
+        times.append(time)
+        block.append(frame[::downscale, ::downscale].copy())
+        if len(block) == block_size:
+            hist_prev = add_block_distances(block, hist_prev, distances)
+            block = []
+    if block:
+        add_block_distances(block, hist_prev, distances)
+    distances = np.concatenate(distances) if distances else np.zeros(0)
+    return (times, distances)
+
+def add_block_distances(block, hist_prev, distances):
+    """appends the distances between the consecutive frames of 
+    `block` (and from the last histogram of the previous block) 
+    to `distances`, returning the last histogram of the block."""
+    hists = calc_hists(block)
+    if hist_prev is not None:
+        hists = np.vstack((hist_prev, hists))
+    distances.append(chi_square_distances(hists))
+    return hists[-1:]
+
+def boundaries_from_distances(times, distances, threshold=CHI_SQUARE_THRESHOLD):
+    """returns the list of times at which shot boundaries occur, 
+    given the `times` of the frames and the `distances` between 
+    consecutive frames (see `find_frame_distances`)."""
+    if not len(times):
+        return []
+    milliseconds = times_to_milliseconds(times)
+    shot_boundaries = [0]
+    for idx in np.flatnonzero(np.asarray(distances) > threshold) + 1:
+        if milliseconds[idx] - milliseconds[shot_boundaries[-1]] > MIN_SHOT_LENGTH * 1000:
+            shot_boundaries.append(idx)
+    return [times[idx] for idx in shot_boundaries]
+
+class BoundaryDetector:
+    """Finds shot boundaries one frame at a time, keeping only the 
+    histogram of the previous frame so that each frame is read 
+    and histogrammed once."""
+
+    def __init__(self):
+        self.shot_boundaries = []
+        self.hist_prev = None
+
+    def update(self, time, frame):
+        """adds the decoded (bgr) `frame` shown at `time` and returns
+        True if it starts a new shot."""
+        hist_now = calc_hist(frame)
+        is_boundary = False
+        if self.hist_prev is None:
+            is_boundary = True
+        else:
+            dist = cv2.compareHist(self.hist_prev, hist_now, cv2.cv.CV_COMP_CHISQR)
+            if dist > CHI_SQUARE_THRESHOLD:
+                is_boundary = time_diff(self.shot_boundaries[-1], time) > MIN_SHOT_LENGTH
+        if is_boundary:
+            self.shot_boundaries.append(time)
+        self.hist_prev = hist_now
+        return is_boundary
+
+def read_frames(img_paths):
+    """yields a (time, bgr frame) pair for each of the `img_paths`."""
+    for img_path in img_paths:
+        yield (get_time_from_path(img_path), cv2.imread(img_path))
+
 def find_boundaries(img_paths):
     """returns a list of times at which shot boundaries occur. Times are 
     given in the format HH:MM:SS:MMM where
     HH: Hours, MM: Minutes, SS: Seconds, MMM: milliseconds."""
-    shot_boundaries = [get_time_from_path(img_paths[0])]
-    for prev, now in zip(img_paths, img_paths[1:]):
-        hist_prev = get_hist(prev)
-        hist_now = get_hist(now)
-        dist = cv2.compareHist(hist_prev, hist_now, cv2.cv.CV_COMP_CHISQR)
-        # time = "".join(now.split('-')[-1][:-4])
-        time = get_time_from_path(now)
-
-        if dist > 5:
-            if time_diff(shot_boundaries[-1], time) > MIN_SHOT_LENGTH:
-                shot_boundaries.append(time)
-    return shot_boundaries
+    return find_boundaries_in_frames(read_frames(img_paths))
+
+def find_boundaries_in_frames(frames):
+    """returns a list of times at which shot boundaries occur in 
+    `frames`, an iterator of (time, bgr frame) pairs. Times are 
+    given in the format HH:MM:SS:MMM."""
+    detector = BoundaryDetector()
+    for time, frame in frames:
+        detector.update(time, frame)
+    return detector.shot_boundaries
 
 def time_diff(earlier, later):
     """returns the difference betweeen the given times in 
@@ -2,36 +2,23 @@ import os
 import csv
 import dlib
 import shutil
-import pandas as pd
+import numpy as np
 
 from cycling.utils.file_utils import get_paths
-from cycling.utils.time_utils import convert_to_pandas_timestamp
+from cycling.utils.time_utils import times_to_milliseconds
+from cycling.utils.time_utils import format_milliseconds
+from cycling.utils.detection_store import load_detections
+from cycling.utils.detection_store import box_dict, face_name
 
 def get_boundaries(paths):
-    """returns a list of shot boundary times as pandas
-    timestamps."""
+    """returns a sorted array of shot boundary times, measured 
+    in milliseconds."""
     boundaries = []
     with open(paths['shot_boundaries'], 'rb') as csvfile:
         shot_reader = csv.reader(csvfile, delimiter = ',')
         for row in shot_reader:
             boundaries.append(row[0])
-    pd_boundaries = [convert_to_pandas_timestamp(boundary) for boundary in boundaries]
-    return pd_boundaries
-
-def get_meta_information(paths):
-    """returns the meta infomration (times, boxes
-    and gradients) associated with each face 
-    detection."""
-    times, boxes, gradients = [], [], []
-    with open(paths['meta'], 'rb') as csvfile:
-        box_reader = csv.reader(csvfile, delimiter=',')
-        next(box_reader)
-        for row in box_reader:
-            times.append(row[1])
-            boxes.append(row[2])
-            gradients.append(row[3])
-    meta = {'times': times, 'boxes': boxes, 'gradients': gradients}
-    return meta
+    return np.sort(times_to_milliseconds(boundaries))
 
 def format_path(root, stage_id, time, box_idx, gradient, box=None):
     """returns a formatted file path.  If a bounding box is 
@@ -61,40 +48,55 @@ def get_shot_folder_path(paths, shot_idx, gradient):
     images belonging to the given shot.  If the directory
     doesn't already exist, it is created."""
     shot_folder_path = paths['face_shots'] + str(shot_idx) + '/' + str(gradient) + '/'
-    if not os.path.exists(shot_folder_path):
-        os.makedirs(shot_folder_path)
-    return shot_folder_path
+    return paths.ensure_dir(shot_folder_path)
 
 def add_face_to_shot(time, stage_id, shot_idx, box_idx, paths, gradient, box):
     """adds the face detected at the given time to the given shot"""
-    src_root = paths['faces']
-    src_path = format_path(src_root, stage_id, time, box_idx, gradient)
+    src_path = face_name(paths['faces'], stage_id, time, box_idx, gradient)
     dest_root = get_shot_folder_path(paths, shot_idx, gradient)
     dest_path = format_path(dest_root, stage_id, time, box_idx, gradient, box)        
     shutil.copyfile(src_path, dest_path)
 
 def find_shot_id(time, boundaries):
     """returns `shot_idx` which identifies which boundaries 
-    the time time lies between."""
-    is_before_boundaries = [time < boundary for boundary in boundaries]
-    if True in is_before_boundaries:
-        shot_idx = is_before_boundaries.index(True)
-    else:
-        shot_idx = len(boundaries)
-    return shot_idx
+    the time time lies between (the number of boundaries at or 
+    before it). `time` may also be an array of times, given in
+    the same units as the sorted `boundaries`."""
+    return np.searchsorted(boundaries, time, side='right')
+
+def group_detections_by_shot(detections, boundaries):
+    """returns a list of ((shot_idx, gradient), detections) pairs,
+    ordered by shot and gradient, which groups the detections with
+    valid boxes according to the shot and gradient in which they 
+    were detected."""
+    valid = np.array([is_valid_box(box_dict(detection)) for detection in detections], 
+                     dtype=bool)
+    detections = detections[valid]
+    shot_ids = find_shot_id(detections['time_ms'], boundaries)
+    groups = []
+    for shot_idx in np.unique(shot_ids):
+        shot_detections = detections[shot_ids == shot_idx]
+        gradients = shot_detections['gradient']
+        unknown = np.isnan(gradients)
+        for gradient in np.unique(gradients[~unknown]):
+            groups.append(((shot_idx, gradient), shot_detections[gradients == gradient]))
+        if unknown.any():
+            groups.append(((shot_idx, np.nan), shot_detections[unknown]))
+    return groups
 
 def group_faces_by_shot(root_path, stage_id):
     """groups faces according to the shot and gradient
     in which they were detected and copies them to a folder 
-    representing that shot."""
+    representing that shot.  This is only needed to browse the
+    faces by shot: face tracks are built directly from the 
+    detections (see `tracks.extract_face_tracks`)."""
     paths = get_paths(root_path, stage_id)
     boundaries = get_boundaries(paths)
-    meta = get_meta_information(paths)
-    pd_times = [convert_to_pandas_timestamp(time) for time in meta['times']]
-    for time_idx, pd_time in enumerate(pd_times):
-        print(pd_time)
-        shot_idx = find_shot_id(pd_time, boundaries)
-        gradient = meta['gradients'][time_idx]
-        for box_idx, box in enumerate(eval(meta['boxes'][time_idx])):
-            if is_valid_box(box):
-                add_face_to_shot(meta['times'][time_idx], stage_id, shot_idx, box_idx, paths, gradient, box)
+    detections = load_detections(paths['detections'])
+    shot_ids = find_shot_id(detections['time_ms'], boundaries)
+    times = format_milliseconds(detections['time_ms'])
+    for detection, shot_idx, time in zip(detections, shot_ids, times):
+        box = box_dict(detection)
+        if is_valid_box(box):
+            add_face_to_shot(time, stage_id, shot_idx, detection['box_idx'], 
+                             paths, detection['gradient'], box)
@@ -6,19 +6,27 @@ from tqdm import *
 from file_utils import get_target_dir
 from time_utils import formatted_times_in_video
 from snapshot_utils import get_dar_dimensions
-from snapshot_utils import snapshot
+from snapshot_utils import save_frame
+from frame_sources import VideoFrames
 from file_utils import get_paths
 
+def get_precis_frames(paths, DAR=(16.0/9.0), grayscale=False):
+    """returns a frame source that decodes a frame of 
+    src_video every second (resized to the display aspect
+    ratio) without writing anything to disk."""
+    src_video = paths['src_video']
+    dar_dims = get_dar_dimensions(src_video, DAR=DAR)
+    times = formatted_times_in_video(src_video)
+    return VideoFrames(src_video, times, dimensions=dar_dims, grayscale=grayscale)
+
 def take_precis_snapshots(root_path, stage_id, DAR=(16.0/9.0)):
     """saves a snapshot of src_video every second 
-    and saves it to the target_dir."""
+    and saves it to the target_dir. The video is decoded
+    in a single sequential pass rather than seeking to
+    each second with a separate ffmpeg process."""
     DAR = DAR
     paths = get_paths(root_path, stage_id)
-    src_video = paths['src_video']
-    target_dir = paths['precis']
-    dar_dims = get_dar_dimensions(src_video, DAR=DAR)
-    times = formatted_times_in_video(src_video)
-    if not os.path.exists(target_dir):
-        os.makedirs(target_dir)
-    for time in tqdm(times):        
-        snapshot(src_video, target_dir, stage_id, time=time, dimensions=dar_dims)
\ No newline at end of file
+    target_dir = paths.ensure_dir(paths['precis'])
+    frames = get_precis_frames(paths, DAR=DAR)
+    for time, frame in tqdm(frames):
+        save_frame(frame, target_dir, stage_id, time)
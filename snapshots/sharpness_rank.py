@@ -6,6 +6,14 @@ from tqdm import *
 from os import path
 from file_utils import get_img_paths_in_dir
 from scipy.ndimage.filters import gaussian_laplace
+from scipy.ndimage.filters import gaussian_filter
+from scipy.ndimage.filters import convolve
+
+# Half-width of the block of low frequencies removed by the fft metric
+FFT_FILTER_SIZE = 20
+LAPLACIAN_KERNEL = np.array([[[0, 1, 0],
+                              [1, -4, 1],
+                              [0, 1, 0]]], dtype=np.float64)
 
 
 def extract_sharpest_frames(src_dir, target_dir, stage_id, sigma=3):
@@ -17,21 +25,27 @@ def extract_from_dir(root, dirname, target_dir, stage_id, sigma):
     path = root + dirname + '/'
     img_names = get_img_paths_in_dir(path)
     sharpest_img = find_sharpest(img_names, sigma)
-    target_name = target_dir + stage_id + '-' + \
-        dirname[:2] + '_' + dirname[3:] + '.jpg'
+    target_name = sharpest_frame_name(target_dir, stage_id, dirname)
     shutil.copy(sharpest_img, target_name)
 
+def sharpest_frame_name(target_dir, stage_id, target_time):
+    """returns the path under which the sharpest frame of the 
+    cluster taken around `target_time` is stored."""
+    return (target_dir + str(stage_id) + '-' + 
+            target_time[:2] + '_' + target_time[3:] + '.jpg')
+
 def find_sharpest(img_names, sigma):
     """calculates a 'sharpness' value for the center of each image
     named in img_names and returns the img with the largest value."""
-    sharpness_scores = {}
-    for img_name in img_names:
-        img = cv2.imread(img_name, cv2.CV_LOAD_IMAGE_GRAYSCALE)
-        focused_img = focus_on_center(img, scale=0.7)
-        sharpness = calculate_sharpness_with_LoG(focused_img, sigma)
-        sharpness_scores[img_name] = sharpness
-    sharpest_img = max(sharpness_scores, key=sharpness_scores.get)
-    return sharpest_img
+    imgs = [cv2.imread(img_name, cv2.CV_LOAD_IMAGE_GRAYSCALE) for img_name in img_names]
+    sharpest_idx = find_sharpest_frame(imgs, sigma)
+    return img_names[sharpest_idx]
+
+def find_sharpest_frame(frames, sigma, **kwargs):
+    """returns the index of the sharpest of the given (grayscale)
+    frames, which are scored together as a single batch."""
+    scores = score_batch(np.array(frames), metric='LoG', sigma=sigma, **kwargs)
+    return int(np.argmax(scores))
 
 
 def calculate_sharpness_with_LoG(img, sigma):
@@ -75,20 +89,90 @@ def high_pass_filter(spectrum, filter_size):
 def vertical_crop(img, scale):
     """returns a cropped version of `img`. The cropped image is
     formed by cutting off the top and bottom of the image.  This is 
-    often useful for removing text and logos."""
-    rows, cols = img.shape
+    often useful for removing text and logos. `img` may also be a 
+    (N, H, W) batch of images."""
+    rows, cols = img.shape[-2:]
     centre_row = rows / 2
     scaled_height = rows * scale
-    cropped_img = img[centre_row - (scaled_height/2): centre_row + (scaled_height/2),:]
+    top, bottom = int(centre_row - (scaled_height/2)), int(centre_row + (scaled_height/2))
+    cropped_img = img[..., top:bottom, :]
     return cropped_img
 
 def focus_on_center(img, scale=0.7):
     """returns a cropped version of `img`. The cropped image 
     is formed by scaling down the size of `img` (by `scale`) and 
-    centering a rectange of this size on the center of `img`."""
-    rows, cols = img.shape
+    centering a rectange of this size on the center of `img`. `img`
+    may also be a (N, H, W) batch of images."""
+    rows, cols = img.shape[-2:]
     crow, ccol = rows/2 , cols/2
     scaled_width, scaled_height = cols * scale, rows * scale
-    img = img[crow - (scaled_height/2):crow + (scaled_height/2), 
-              ccol - (scaled_width/2):ccol + (scaled_width/2)] 
-    return img
\ No newline at end of file
+    top, bottom = int(crow - (scaled_height/2)), int(crow + (scaled_height/2))
+    left, right = int(ccol - (scaled_width/2)), int(ccol + (scaled_width/2))
+    img = img[..., top:bottom, left:right]
+    return img
+
+def crop_batch(batch, center_scale=0.7, vertical_scale=0.7):
+    """applies the center and vertical crops used for LoG scoring 
+    to a whole (N, H, W) batch of images at once."""
+    focused = focus_on_center(batch, scale=center_scale)
+    return vertical_crop(focused, scale=vertical_scale)
+
+def batch_sharpness_with_LoG(batch, sigma=3):
+    """returns the LoG 'sharpness' (see `calculate_sharpness_with_LoG`) 
+    of every image in the (N, H, W) batch.  The filter is computed in
+    the dtype of the batch, exactly as it is for a single image, and 
+    the top bin of each image's 10-bar histogram is counted with array
+    operations."""
+    sigmas = (0, sigma, sigma)
+    filtered = gaussian_filter(batch, sigmas, order=(0, 2, 0), output=batch.dtype)
+    filtered += gaussian_filter(batch, sigmas, order=(0, 0, 2), output=batch.dtype)
+    flat = filtered.reshape((len(filtered), -1))
+    lower = flat.min(axis=1).astype(np.float64)
+    upper = flat.max(axis=1).astype(np.float64)
+    # np.histogram widens the range of constant images by 0.5
+    constant = lower == upper
+    lower[constant] = lower[constant] - 0.5
+    upper[constant] = upper[constant] + 0.5
+    top_edges = 9 * ((upper - lower) / 10) + lower
+    return np.sum(flat >= top_edges[:, None], axis=1).astype(np.float64)
+
+def batch_sharpness_with_fft(batch, filter_size=FFT_FILTER_SIZE):
+    """returns the high-pass spectral 'sharpness' (see 
+    `calculate_sharpness_with_fft`) of every image in the (N, H, W)
+    batch."""
+    spectrum = np.fft.fftshift(np.fft.fft2(batch, axes=(-2, -1)), axes=(-2, -1))
+    rows, cols = spectrum.shape[-2:]
+    crow, ccol = rows // 2, cols // 2
+    spectrum[:, crow - filter_size:crow + filter_size,
+             ccol - filter_size:ccol + filter_size] = 0.00000001
+    log_magnitude = 20 * np.log(np.abs(spectrum))
+    return np.sum(log_magnitude, axis=(1, 2))
+
+def batch_sharpness_with_laplacian_variance(batch):
+    """returns the variance of the Laplacian of every image in 
+    the (N, H, W) batch. Sharp images have strong edges and so a
+    high variance."""
+    laplacian = convolve(batch.astype(np.float64), LAPLACIAN_KERNEL, mode='reflect')
+    return laplacian.var(axis=(1, 2))
+
+SHARPNESS_METRICS = {'LoG': batch_sharpness_with_LoG,
+                     'fft': batch_sharpness_with_fft,
+                     'laplacian_variance': batch_sharpness_with_laplacian_variance}
+
+def score_batch(batch, metric='LoG', downscale=None, keep=2, **kwargs):
+    """returns an array of 'sharpness' scores for the (N, H, W) batch,
+    using one of the SHARPNESS_METRICS (extra keyword arguments are 
+    passed on to the metric). The crops are applied once for the whole 
+    batch. If `downscale` is given, every image is first scored at 
+    1/downscale resolution and only the `keep` best candidates are 
+    scored at full resolution (the rest are given a score of -inf)."""
+    score_fn = SHARPNESS_METRICS[metric]
+    cropped = crop_batch(np.asarray(batch))
+    if not downscale or len(cropped) <= keep:
+        return score_fn(cropped, **kwargs)
+    coarse_scores = score_fn(cropped[:, ::downscale, ::downscale], **kwargs)
+    candidates = np.sort(np.argsort(-coarse_scores, kind='mergesort')[:keep])
+    scores = np.empty(len(cropped))
+    scores.fill(-np.inf)
+    scores[candidates] = score_fn(cropped[candidates], **kwargs)
+    return scores
\ No newline at end of file
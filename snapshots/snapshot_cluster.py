@@ -1,33 +1,153 @@
 import os
 import sys
+import cv2
 import numpy as np
 
 from tqdm import *
+from Queue import Empty
+from multiprocessing import Pool, Manager
 from file_utils import get_target_dir
 from time_utils import time_cluster 
+from time_utils import times_to_milliseconds
+from time_utils import cluster_milliseconds
+from time_utils import format_milliseconds
 from time_utils import get_num_frames
 from time_utils import formatted_times_in_video
 from snapshot_utils import get_dar_dimensions
 from snapshot_utils import get_frame_dims
 from snapshot_utils import snapshot
+from snapshot_utils import stream_frames
+from snapshot_utils import save_frame
+from snapshot_utils import resize_frame
 from sharpness_rank import extract_sharpest_frames
+from sharpness_rank import find_sharpest_frame
+from sharpness_rank import sharpest_frame_name
 
-def snapshot_cluster(targets, paths, stage_id, dar_dims):
+CLUSTER_SIZE = 5
+MAX_OFFSET = 200 # milliseconds
+
+def get_cluster_pairs(targets, cluster_size=CLUSTER_SIZE, max_offset=MAX_OFFSET):
+    """returns a list of (time, target) pairs, sorted by time, 
+    that contains every time in the cluster around each target."""
+    milliseconds = times_to_milliseconds(targets)
+    clusters = cluster_milliseconds(milliseconds, cluster_size, max_offset).ravel()
+    owners = np.repeat(np.arange(len(targets)), cluster_size)
+    order = np.lexsort((owners, clusters))
+    times = format_milliseconds(clusters[order])
+    return [(time, targets[owners[idx]]) for time, idx in zip(times, order)]
+
+def snapshot_cluster_chunk(targets, paths, stage_id, dar_dims, progress):
+    """saves the snapshot clusters for a contiguous chunk of 
+    targets by decoding the chunk sequentially.  `progress` is 
+    called once for each target whose cluster is complete."""
+    pairs = get_cluster_pairs(targets)
+    remaining = dict((target, 0) for target in targets)
+    for time, target in pairs:
+        remaining[target] = remaining[target] + 1
+    times = [time for (time, target) in pairs]
+    frames = stream_frames(paths['src_video'], times)
+    for (time, frame), (_, target) in zip(frames, pairs):
+        target_dir = get_target_dir(paths['tmp_clusters'], target)
+        save_frame(frame, target_dir, stage_id, time, dar_dims)
+        remaining[target] = remaining[target] - 1
+        if not remaining[target]:
+            progress()
+
+def sharpest_in_cluster_chunk(targets, paths, stage_id, dar_dims, progress, sigma=3):
+    """for a contiguous chunk of targets, decodes the cluster 
+    of frames around each target, scores them in memory and saves 
+    only the sharpest frame to the tete directory.  `progress` is 
+    called once for each target that has been saved."""
+    pairs = get_cluster_pairs(targets)
+    remaining = dict((target, 0) for target in targets)
+    for time, target in pairs:
+        remaining[target] = remaining[target] + 1
+    clusters = dict((target, []) for target in targets)
+    times = [time for (time, target) in pairs]
+    frames = stream_frames(paths['src_video'], times)
+    for (time, frame), (_, target) in zip(frames, pairs):
+        clusters[target].append(resize_frame(frame, dar_dims))
+        remaining[target] = remaining[target] - 1
+        if not remaining[target]:
+            cluster = clusters.pop(target)
+            gray_frames = [cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) for img in cluster]
+            sharpest = cluster[find_sharpest_frame(gray_frames, sigma)]
+            cv2.imwrite(sharpest_frame_name(paths['tete'], stage_id, target), 
+                        sharpest, [cv2.IMWRITE_JPEG_QUALITY, 95])
+            progress()
+
+def cluster_chunk_worker(args):
+    """runs the given chunk function in a worker process, 
+    reporting progress through a shared queue."""
+    chunk_fn, targets, paths, stage_id, dar_dims, queue = args
+    chunk_fn(targets, paths, stage_id, dar_dims, progress=lambda: queue.put(1))
+
+def split_into_chunks(targets, num_chunks):
+    """splits the (sorted) targets into at most `num_chunks`
+    contiguous chunks of roughly equal size."""
+    chunks = np.array_split(np.arange(len(targets)), num_chunks)
+    return [[targets[idx] for idx in chunk] for chunk in chunks if len(chunk)]
+
+def process_in_chunks(chunk_fn, targets, paths, stage_id, dar_dims, workers=1):
+    """applies `chunk_fn` to the targets. If `workers` is greater 
+    than one, the targets are split into contiguous chunks of time 
+    that are decoded in parallel by a pool of worker processes, with
+    their progress merged into a single progress bar."""
+    targets = sorted(targets)
+    progress_bar = tqdm(total=len(targets))
+    if workers < 2:
+        chunk_fn(targets, paths, stage_id, dar_dims, 
+                 progress=lambda: progress_bar.update(1))
+        progress_bar.close()
+        return
+    queue = Manager().Queue()
+    chunks = split_into_chunks(targets, workers)
+    jobs = [(chunk_fn, chunk, paths, stage_id, dar_dims, queue) for chunk in chunks]
+    pool = Pool(processes=len(chunks))
+    try:
+        result = pool.map_async(cluster_chunk_worker, jobs)
+        completed = 0
+        while completed < len(targets):
+            try:
+                completed = completed + queue.get(timeout=1)
+                progress_bar.update(1)
+            except Empty:
+                if result.ready():
+                    break
+        result.get() # re-raises any exception from the workers
+    finally:
+        pool.terminate()
+        pool.join()
+        progress_bar.close()
+
+def snapshot_cluster(targets, paths, stage_id, dar_dims, workers=1):
     """creates a cluster of (cluster_size) snapshots from the video 
     specified by `src_video` at the times specified by times
-    and saves them in `dest_dir`."""
-    cluster_size = 5
-    max_offset = 200
-    for selected_time in tqdm(targets):
-        target_dir = get_target_dir(paths['tmp_clusters'], selected_time)
-        cluster = time_cluster(selected_time, cluster_size, max_offset)
-        for time in cluster:
-            snapshot(paths['src_video'], target_dir, 
-                    stage_id, time=time, dimensions=dar_dims)
-
-def take_cluster_snapshots_at_targets(targets, paths, stage_id, DAR = (16.0 / 9.0)):
+    and saves them in `dest_dir`. If `workers` is greater than one,
+    the targets are split into contiguous chunks of time that are 
+    decoded in parallel by a pool of worker processes."""
+    process_in_chunks(snapshot_cluster_chunk, targets, paths, 
+                      stage_id, dar_dims, workers)
+
+def snapshot_sharpest(targets, paths, stage_id, dar_dims, workers=1):
+    """saves the sharpest frame from the cluster around each target
+    directly to the tete directory, without writing the clusters 
+    to `tmp_clusters`."""
+    process_in_chunks(sharpest_in_cluster_chunk, targets, paths, 
+                      stage_id, dar_dims, workers)
+
+def take_cluster_snapshots_at_targets(targets, paths, stage_id, DAR = (16.0 / 9.0), 
+                                      workers=1, fused=False):
     """takes a cluster of snapshot of src_video every target 
-    and saves it to the target_dir."""
+    and saves it to the target_dir. In `fused` mode the clusters are
+    scored in memory and only the sharpest frames are written."""
     dar_dims = get_dar_dimensions(paths['src_video'], DAR=DAR)
-    snapshot_cluster(targets=targets, paths=paths, stage_id=stage_id, dar_dims=dar_dims)
-    extract_sharpest_frames(paths['tmp_clusters'], paths['tete'], stage_id)
\ No newline at end of file
+    paths.ensure_dir(paths['tete'])
+    if fused:
+        snapshot_sharpest(targets=targets, paths=paths, stage_id=stage_id, 
+                          dar_dims=dar_dims, workers=workers)
+        return
+    paths.ensure_dir(paths['tmp_clusters'])
+    snapshot_cluster(targets=targets, paths=paths, stage_id=stage_id, 
+                     dar_dims=dar_dims, workers=workers)
+    extract_sharpest_frames(paths['tmp_clusters'], paths['tete'], stage_id)
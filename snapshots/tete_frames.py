@@ -6,10 +6,13 @@ from tqdm import *
 from camera import Camera
 from file_utils import get_img_paths_in_dir
 from time_utils import get_time_from_path
-from time_utils import get_times_in_interval
-from time_utils import get_contiguous_intervals
-from snapshot_utils import snapshot
+from time_utils import times_to_milliseconds
+from time_utils import find_contiguous_intervals
+from time_utils import expand_intervals
+from time_utils import format_milliseconds
+from snapshot_utils import save_frame
 from snapshot_utils import get_dar_dimensions
+from frame_sources import VideoFrames
 from snapshot_cluster import take_cluster_snapshots_at_targets
 from file_utils import get_paths
 
@@ -21,28 +24,35 @@ def get_tete_images(paths):
     tete_imgs = [img for (state, img) in labeled_imgs if state == Camera.Tete]
     return tete_imgs
 
-def get_tete_intervals(paths):
+def get_tete_target_frames(paths, step):
+    """returns the formatted times separated by `step` milliseconds
+    in each contiguous interval of tete frames. The times are 
+    generated as integer milliseconds and only formatted at the end."""
     tete_imgs = get_tete_images(paths)
+    if not tete_imgs:
+        return []
     times = [get_time_from_path(tete_img) for tete_img in tete_imgs]
-    intervals = get_contiguous_intervals(times)
-    return intervals   
+    starts, stops = find_contiguous_intervals(times_to_milliseconds(times))
+    targets = expand_intervals(starts, stops, step)
+    return format_milliseconds(targets)
 
-def get_tete_target_frames(paths, step):
-    intervals = get_tete_intervals(paths)
-    if not intervals:
-        return []
-    target_lists = [get_times_in_interval(interval, step) for interval in intervals]
-    targets = sum(target_lists, []) # flattens the list
-    return targets
+def get_tete_frames(paths, step=40, DAR=(16.0 / 9.0)):
+    """returns a frame source that decodes the tete frames 
+    separated by `step` milliseconds directly from the video, 
+    without writing them to disk."""
+    targets = get_tete_target_frames(paths, step)
+    dar_dims = get_dar_dimensions(paths['src_video'], DAR=DAR)
+    return VideoFrames(paths['src_video'], targets, dimensions=dar_dims)
 
 def extract_all_tete_frames(root_path, stage_id, step=40, DAR=(16.0 / 9.0)):
     paths = get_paths(root_path, stage_id)
-    targets = get_tete_target_frames(paths, step)
-    dar_dims = get_dar_dimensions(paths['src_video'], DAR=DAR)
-    for time in tqdm(targets):
-        snapshot(paths['src_video'], paths['tete'], stage_id, time=time, dimensions=dar_dims)
+    frames = get_tete_frames(paths, step, DAR)
+    target_dir = paths.ensure_dir(paths['tete'])
+    for time, frame in tqdm(frames):
+        save_frame(frame, target_dir, stage_id, time)
 
-def extract_tete_snapshots(root_path, stage_id, step):
+def extract_tete_snapshots(root_path, stage_id, step, workers=1, fused=False):
     paths = get_paths(root_path, stage_id)
     targets = get_tete_target_frames(paths, step)
-    take_cluster_snapshots_at_targets(targets, paths, stage_id)
+    take_cluster_snapshots_at_targets(targets, paths, stage_id, 
+                                      workers=workers, fused=fused)
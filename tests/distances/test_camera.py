@@ -5,10 +5,45 @@ currentdir = os.path.dirname(currentdir_loc)
 parentdir = os.path.dirname(currentdir)
 sys.path.insert(0,parentdir) 
 import unittest
+import shutil
+import tempfile
+import numpy as np
 import cv2
 
 from test_settings import ROOT_PATH_2012
 from camera import CameraFocus
+from camera_log import CameraFeatureLog
+
+class CountedFrames:
+    """a frame source (like VideoFrames) that records the times
+    of the frames it decodes."""
+
+    def __init__(self, times, decoded):
+        self.times = times
+        self.decoded = decoded
+
+    def select(self, times):
+        return CountedFrames(times, self.decoded)
+
+    def __iter__(self):
+        for time in self.times:
+            self.decoded.append(time)
+            yield (time, np.full((4, 4), int(time[6:8]), np.uint8))
+
+class NoTemplates:
+    """stands in for the template bank, without search regions."""
+    rois = {}
+
+class LabelledCameraFocus(CameraFocus):
+    """a CameraFocus in which frames of odd seconds are distance 
+    labeled, without loading any templates."""
+
+    def __init__(self, annotations):
+        self.annotations = annotations
+        self.template_bank = NoTemplates()
+
+    def is_distance_labeled(self, img):
+        return bool(img[0, 0] % 2)
 
 class TestCamera(unittest.TestCase):
 
@@ -21,5 +56,33 @@ class TestCamera(unittest.TestCase):
         num_precis_frames = len(camera_focus.frames)
         self.assertEqual(expected_num_precis_frames, num_precis_frames)
 
+class TestClassifyFrames(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.feature_log = CameraFeatureLog(os.path.join(self.tmp_dir, '8.sqlite'))
+        self.times = ['00:00:%02d:000' % second for second in range(6)]
+
+    def tearDown(self):
+        self.feature_log.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_logged_frames_are_not_decoded(self):
+        """check that only the frames missing from the feature log
+        (and not annotated) are decoded from a frame source."""
+        camera_focus = LabelledCameraFocus({'00:00:04:000': 'T'})
+        self.feature_log.add('00:00:01:000', True)
+        self.feature_log.add('00:00:02:000', False)
+        decoded = []
+        times, labels = camera_focus.classify_frames(CountedFrames(self.times, decoded),
+                                                     self.feature_log)
+        self.assertEqual(['00:00:00:000', '00:00:03:000', '00:00:05:000'], decoded)
+        self.assertEqual(self.times, times)
+        self.assertEqual([False, True, False, True, None, True], labels)
+        # once every frame is logged, nothing is decoded
+        decoded = []
+        camera_focus.classify_frames(CountedFrames(self.times, decoded), self.feature_log)
+        self.assertEqual([], decoded)
+
 if __name__ == "__main__":
     unittest.main()
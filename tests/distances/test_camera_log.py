@@ -0,0 +1,45 @@
+"""Add parent directory to path"""
+import os,sys,inspect
+currentdir_loc = os.path.abspath(inspect.getfile(inspect.currentframe()))
+currentdir = os.path.dirname(currentdir_loc)
+parentdir = os.path.dirname(currentdir)
+sys.path.insert(0,parentdir) 
+import unittest
+import shutil
+import tempfile
+
+from camera_log import CameraFeatureLog
+
+class TestCameraFeatureLog(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'camera_states', '8.sqlite')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_features_survive_reopening(self):
+        """check that frames added to the log (even without an
+        explicit commit) can be read back after it is reopened."""
+        feature_log = CameraFeatureLog(self.path, commit_interval=2)
+        feature_log.add('00:00:01:000', True)
+        feature_log.add('00:00:02:000', False)
+        feature_log.add('00:00:03:000', True)
+        feature_log.close()
+        expected = {'00:00:01:000': True, 
+                    '00:00:02:000': False,
+                    '00:00:03:000': True}
+        self.assertEqual(expected, CameraFeatureLog(self.path).labels())
+
+    def test_rois_round_trip(self):
+        """check that template search regions are stored."""
+        roi = {'top_left_x': 1, 'top_left_y': 2, 
+               'bottom_right_x': 30, 'bottom_right_y': 40}
+        feature_log = CameraFeatureLog(self.path)
+        feature_log.save_rois({'flag': roi})
+        feature_log.close()
+        self.assertEqual({'flag': roi}, CameraFeatureLog(self.path).rois())
+
+if __name__ == "__main__":
+    unittest.main()
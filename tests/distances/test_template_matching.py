@@ -0,0 +1,46 @@
+"""Add parent directory to path"""
+import os,sys,inspect
+currentdir_loc = os.path.abspath(inspect.getfile(inspect.currentframe()))
+currentdir = os.path.dirname(currentdir_loc)
+parentdir = os.path.dirname(currentdir)
+sys.path.insert(0,parentdir) 
+import unittest
+import numpy as np
+
+from template_matching import TemplateBank
+from template_matching import best_match
+
+class TestTemplateBank(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.template = (rng.rand(12, 16) * 255).astype(np.uint8)
+        self.frames = []
+        for offset in [0, 2, -3]:
+            frame = (rng.rand(120, 200) * 60).astype(np.uint8)
+            frame[30 + offset:42 + offset, 50:66] = self.template
+            self.frames.append(frame)
+
+    def test_roi_learned_from_first_confident_match(self):
+        """check that the bank learns a search region from the first
+        confident match and that restricted searches find the same 
+        match as a full frame search."""
+        bank = TemplateBank({'flag': self.template})
+        self.assertFalse('flag' in bank.rois)
+        for frame in self.frames:
+            expected = best_match(frame, self.template)
+            max_val, max_loc = bank.best_match(frame, 'flag')
+            self.assertEqual(expected[1], max_loc)
+            self.assertAlmostEqual(expected[0], max_val, places=5)
+        roi = bank.rois['flag']
+        self.assertEqual((40, 20), (roi['top_left_x'], roi['top_left_y']))
+
+    def test_supplied_roi_is_used(self):
+        """check that a supplied region restricts the search."""
+        empty_roi = {'top_left_x': 100, 'top_left_y': 60,
+                     'bottom_right_x': 200, 'bottom_right_y': 120}
+        bank = TemplateBank({'flag': self.template}, rois={'flag': empty_roi})
+        self.assertFalse(bank.contains(self.frames[0], 'flag'))
+
+if __name__ == "__main__":
+    unittest.main()
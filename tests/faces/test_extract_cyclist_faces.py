@@ -0,0 +1,111 @@
+"""Add parent directory to path"""
+import os,sys,inspect
+currentdir_loc = os.path.abspath(inspect.getfile(inspect.currentframe()))
+currentdir = os.path.dirname(currentdir_loc)
+parentdir = os.path.dirname(currentdir)
+sys.path.insert(0,parentdir)
+import random
+import shutil
+import unittest
+import tempfile
+import numpy as np
+
+from extract_cyclist_faces import extract_faces_in_batches, tete_frame_names
+from distance_tracker import DistanceTracker
+from snapshot_utils import snapshot_name
+from file_utils import get_paths, ensure_dir
+
+class Box:
+    """a detected box, as returned by the face detector."""
+
+    def __init__(self, left, top, right, bottom):
+        self.box = (left, top, right, bottom)
+
+    def left(self):
+        return self.box[0]
+
+    def top(self):
+        return self.box[1]
+
+    def right(self):
+        return self.box[2]
+
+    def bottom(self):
+        return self.box[3]
+
+class FaceDetector:
+    """finds a single (small) face in every frame."""
+
+    def run(self, img, upsample):
+        return [Box(0, 0, 5, 5)], [0.9], [0]
+
+class SignTracker(DistanceTracker):
+    """reads the distance to go from the grey level of each frame,
+    so that only the OCR is replaced."""
+
+    def region(self, frame):
+        return frame[:18, :52, 0].copy()
+
+    def find_numbers(self, regions):
+        return [region.mean() / 10 for region in regions]
+
+class GradientProfile:
+    """a profile in which the gradient is the distance to go."""
+
+    def gradient_at(self, distance_to_go):
+        return distance_to_go
+
+class TestExtractFacesInBatches(unittest.TestCase):
+
+    def setUp(self):
+        self.root_path = tempfile.mkdtemp() + '/'
+        self.paths = get_paths(self.root_path, 1)
+        self.cache = {'paths': self.paths,
+                      'detector': FaceDetector(),
+                      'distance_tracker': SignTracker(model=None, templates=None),
+                      'gradient_profile': GradientProfile(),
+                      'gradients': {}}
+        # one frame every 40ms, in which the distance to go falls
+        # by 1km per frame from 20km
+        self.times = ['00:00:00:%03d' % (40 * idx) for idx in range(10)]
+        self.frames = dict((time, np.full((40, 60, 3), 200 - 10 * idx, np.uint8))
+                           for idx, time in enumerate(self.times))
+        self.distances = [20.0 - idx for idx in range(10)]
+
+    def tearDown(self):
+        shutil.rmtree(self.root_path)
+
+    def extract(self, times):
+        """returns the (time_ms, gradient) of the faces found in
+        the frames at the given `times`."""
+        images = [(snapshot_name(self.paths['tete'], 1, time), self.frames[time])
+                  for time in times]
+        records = extract_faces_in_batches(images, self.cache, batch_size=4)
+        return [(int(record['time_ms'][0]), record['gradient'][0]) for record in records]
+
+    def test_frames_in_time_order(self):
+        """check that the distance read in each frame is kept when
+        the frames are given in time order."""
+        expected = [(40 * idx, distance) for idx, distance in enumerate(self.distances)]
+        self.assertEqual(expected, self.extract(self.times))
+
+    def test_frames_out_of_order(self):
+        """check that frames listed out of order lose their readings
+        (as later distances are rejected as misreads) unless they are
+        sorted by `tete_frame_names`."""
+        shuffled = self.times[:]
+        random.Random(3).shuffle(shuffled)
+        gradients = [gradient for _, gradient in sorted(self.extract(shuffled))]
+        self.assertNotEqual(self.distances, gradients)
+        ensure_dir(self.paths['tete'])
+        for time in shuffled:
+            open(snapshot_name(self.paths['tete'], 1, time), 'w').close()
+        names = tete_frame_names(self.paths)
+        self.assertEqual([snapshot_name(self.paths['tete'], 1, time)
+                          for time in self.times], names)
+        self.cache['distance_tracker'].reset()
+        times = [name[-16:-4] for name in names]
+        self.assertEqual(self.distances, [gradient for _, gradient in self.extract(times)])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,6 +5,9 @@ currentdir = os.path.dirname(currentdir_loc)
 parentdir = os.path.dirname(currentdir)
 sys.path.insert(0,parentdir) 
 import unittest
+import shutil
+import tempfile
+import numpy as np
 
 from gradients import get_xml_values
 from gradients import get_elevations
@@ -12,6 +15,10 @@ from gradients import get_precise_distances
 from gradients import calculate_gradients
 from gradients import find_gradient_at_distance
 from gradients import find_gradient
+from gradients import GradientProfile
+from gradients import parse_tcx
+from gradients import get_gradient_profile
+from gradients import profile_key
 from file_utils import get_paths
 from test_settings import ROOT_PATH_2012, ROOT_PATH_2014
 
@@ -64,5 +71,95 @@ class TestGradients(unittest.TestCase):
         self.assertEqual(expected_gradient1, gradient1)
         self.assertEqual(expected_gradient2, gradient2)
 
+    def test_gradient_profile(self):
+        """check that the profile looks up the gradient at the
+        closest marker, for single distances and arrays."""
+        distances = [0, 10, 20, 30, 40]
+        gradients = [15, 13, 14, 17, 19]
+        profile = GradientProfile(distances, gradients, offset=1)
+        # 41 km to go with an offset of 1 km is the start of the stage
+        self.assertEqual(15, profile.gradient_at(41))
+        self.assertEqual(14, profile.gradient_at(16))
+        self.assertEqual(17, profile.gradient_at(15))
+        self.assertEqual([19, 13], list(profile.gradient_at([1, 31])))
+        # markers given out of order are sorted by distance
+        unsorted = GradientProfile(distances[::-1], gradients[::-1], offset=1)
+        self.assertEqual([0, 10, 20, 30, 40], list(unsorted.distances))
+        self.assertEqual(15, unsorted.gradient_at(41))
+        self.assertEqual([19, 13], list(unsorted.gradient_at([1, 31])))
+
+    def test_calculate_gradients(self):
+        """check that a steady climb gives a constant gradient away
+        from the zeroed ends, for single and stacked profiles."""
+        distances = np.arange(40) * 100.0
+        elevations = np.vstack((distances * 0.05, distances * 0.08))
+        gradients = calculate_gradients(elevations, np.vstack((distances, distances)), 
+                                        half_width=4)
+        self.assertEqual((2, 39), gradients.shape)
+        self.assertEqual([0.0] * 3, list(gradients[0,:3]))
+        self.assertTrue(np.allclose(5.0, gradients[0,5:-5]))
+        self.assertTrue(np.allclose(8.0, gradients[1,5:-5]))
+        single = calculate_gradients(elevations[1], distances, half_width=4)
+        self.assertTrue(np.array_equal(single, gradients[1]))
+        # short profiles are all zeros, padded to 2 * half_width
+        short = calculate_gradients(elevations[0,:5], distances[:5], half_width=4)
+        self.assertEqual([0.0] * 8, list(short))
+
+    def test_parse_tcx(self):
+        """check that trackpoint values are matched by tag name
+        and that lap totals are ignored."""
+        tcx = """<?xml version="1.0" encoding="UTF-8"?>
+        <TrainingCenterDatabase xmlns="http://www.garmin.com/xmlschemas/TrainingCenterDatabase/v2">
+        <Courses><Course><Lap><DistanceMeters>500.0</DistanceMeters></Lap><Track>
+        <Trackpoint><Time>2014-07-05T10:00:00Z</Time>
+        <Position><LatitudeDegrees>50.1</LatitudeDegrees><LongitudeDegrees>3.2</LongitudeDegrees></Position>
+        <AltitudeMeters>31.5</AltitudeMeters><DistanceMeters>0.0</DistanceMeters></Trackpoint>
+        <Trackpoint><Time>2014-07-05T10:00:05Z</Time>
+        <AltitudeMeters>32.0</AltitudeMeters><DistanceMeters>41.7</DistanceMeters></Trackpoint>
+        </Track></Course></Courses></TrainingCenterDatabase>"""
+        with tempfile.NamedTemporaryFile(suffix='.tcx') as tcx_file:
+            tcx_file.write(tcx)
+            tcx_file.flush()
+            trackpoints = parse_tcx(tcx_file.name)
+        self.assertEqual([31.5, 32.0], list(trackpoints['elevations']))
+        self.assertEqual([0.0, 41.7], list(trackpoints['distances']))
+        self.assertEqual(50.1, trackpoints['latitudes'][0])
+        self.assertEqual('2014-07-05T10:00:05Z', trackpoints['times'][1])
+
+    def test_stale_gradient_profile_is_rebuilt(self):
+        """check that a saved profile is only reused while its
+        gps data and build parameters are unchanged."""
+        root_path = tempfile.mkdtemp() + '/'
+        tcx = """<?xml version="1.0" encoding="UTF-8"?>
+        <TrainingCenterDatabase xmlns="http://www.garmin.com/xmlschemas/TrainingCenterDatabase/v2">
+        <Courses><Course><Track>
+        <Trackpoint><AltitudeMeters>31.5</AltitudeMeters><DistanceMeters>0.0</DistanceMeters></Trackpoint>
+        <Trackpoint><AltitudeMeters>32.0</AltitudeMeters><DistanceMeters>41.7</DistanceMeters></Trackpoint>
+        </Track></Course></Courses></TrainingCenterDatabase>"""
+        paths = {'strava': root_path + 'Stage1.tcx', 
+                 'gradient_profile': root_path + 'profiles/Stage1.npz', 
+                 'offset': 0}
+        try:
+            with open(paths['strava'], 'w') as tcx_file:
+                tcx_file.write(tcx)
+            stale = GradientProfile([0, 0.04], [9.9, 9.9], 0, key='stale')
+            stale.save(paths['gradient_profile'])
+            profile = get_gradient_profile(paths)
+            self.assertEqual([0.0, 0.0], list(profile.gradients))
+            self.assertEqual(profile_key(paths), profile.key)
+            current = GradientProfile([0, 0.04], [9.9, 9.9], 0, key=profile_key(paths))
+            current.save(paths['gradient_profile'])
+            self.assertEqual([9.9, 9.9], list(get_gradient_profile(paths).gradients))
+            # touching the gps data invalidates the saved profile
+            mtime = os.path.getmtime(paths['strava'])
+            os.utime(paths['strava'], (mtime + 10, mtime + 10))
+            self.assertEqual([0.0, 0.0], list(get_gradient_profile(paths).gradients))
+            # as does asking for different build parameters
+            rebuilt = get_gradient_profile(paths, half_width=4, window='hanning')
+            self.assertEqual(profile_key(paths, 4, 'hanning'), rebuilt.key)
+            self.assertNotEqual(profile_key(paths), rebuilt.key)
+        finally:
+            shutil.rmtree(root_path)
+
 if __name__ == "__main__":
     unittest.main()
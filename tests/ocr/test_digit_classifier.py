@@ -5,15 +5,22 @@ currentdir = os.path.dirname(currentdir_loc)
 parentdir = os.path.dirname(currentdir)
 sys.path.insert(0,parentdir) 
 import unittest
+import shutil
+import tempfile
 import matplotlib
 matplotlib.use('Agg')
 import cv2
+import numpy as np
 
 from digit_classifier import load_model
 from file_utils import get_img_paths_in_dir
 from file_utils import get_paths
 from test_settings import ROOT_PATH_2012, ROOT_PATH_2013, ROOT_PATH_2014
 from digit_classifier import find_number
+from digit_classifier import digits_to_number
+from digit_classifier import nearest_digits
+from digit_classifier import save_model
+from digit_classifier import load_model_data
 from extract_cyclist_faces import load_cache
 
 def get_distance_from_filename(img_name):
@@ -49,6 +56,31 @@ class TestDigitClassifier(unittest.TestCase):
         expected_type = type(cv2.KNearest())
         self.assertEqual(type(model), expected_type)
 
+    def test_compiled_model_round_trip(self):
+        """check that a saved compiled model is preferred and 
+        loads the same samples and responses."""
+        paths = {'digit_model': tempfile.mkdtemp() + '/'}
+        samples = np.random.rand(5, 1600).astype(np.float32)
+        responses = np.arange(5, dtype=np.float32).reshape((5,1))
+        try:
+            save_model(paths, samples, responses)
+            loaded_samples, loaded_responses = load_model_data(paths)
+        finally:
+            shutil.rmtree(paths['digit_model'])
+        self.assertTrue(np.array_equal(samples, loaded_samples))
+        self.assertTrue(np.array_equal(responses, loaded_responses))
+
+    def test_digits_to_number(self):
+        """check that the final digit is read as tenths."""
+        self.assertEqual(131.5, digits_to_number([1, 3, 1, 5]))
+
+    def test_nearest_digits_without_rois(self):
+        """check that an empty batch is not passed to the model."""
+        paths = get_paths(ROOT_PATH_2012, 1)
+        model = load_model(paths)
+        rois = np.zeros((0, 1600), np.float32)
+        self.assertEqual([], nearest_digits(rois, model))
+
     def test_2012_classifier_accuracy(self):
         """check classifier accuracy for the 2012 dataset."""
         root_path = ROOT_PATH_2012
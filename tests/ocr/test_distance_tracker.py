@@ -0,0 +1,70 @@
+"""Add parent directory to path"""
+import os,sys,inspect
+currentdir_loc = os.path.abspath(inspect.getfile(inspect.currentframe()))
+currentdir = os.path.dirname(currentdir_loc)
+parentdir = os.path.dirname(currentdir)
+sys.path.insert(0,parentdir) 
+import unittest
+import numpy as np
+
+from distance_tracker import DistanceTracker, MAX_REJECTIONS
+
+class TestDistanceTracker(unittest.TestCase):
+
+    def test_region_matches(self):
+        """check that only regions with (almost) unchanged pixels
+        are treated as the region that was last read."""
+        tracker = DistanceTracker(model=None, templates=None)
+        region = np.full((18, 52), 100, np.uint8)
+        self.assertFalse(tracker.region_matches(region))
+        tracker.last_region = region
+        self.assertTrue(tracker.region_matches(region + 2))
+        self.assertFalse(tracker.region_matches(region + 20))
+        self.assertFalse(tracker.region_matches(region[:, :40]))
+
+    def test_accept_rejects_increases(self):
+        """check that readings which increase the distance to go are
+        replaced by the previous reading until they persist."""
+        tracker = DistanceTracker(model=None, templates=None)
+        self.assertEqual(131.5, tracker.accept(131.5))
+        self.assertEqual(131.4, tracker.accept(131.4))
+        self.assertEqual(131.4, tracker.accept(181.4))
+        self.assertEqual(130.9, tracker.accept(130.9))
+        for i in range(MAX_REJECTIONS):
+            self.assertEqual(130.9, tracker.accept(150.0))
+        self.assertEqual(150.0, tracker.accept(150.0))
+
+    def test_accept_rejects_drops(self):
+        """check that a misread which drops a digit is rejected, and
+        does not cause the following readings to be rejected."""
+        tracker = DistanceTracker(model=None, templates=None)
+        self.assertEqual(131.5, tracker.accept(131.5))
+        self.assertEqual(131.5, tracker.accept(31.5))
+        self.assertEqual(131.4, tracker.accept(131.4))
+        self.assertEqual(131.3, tracker.accept(131.3))
+        for i in range(MAX_REJECTIONS):
+            self.assertEqual(131.3, tracker.accept(98.2))
+        self.assertEqual(98.2, tracker.accept(98.2))
+
+    def test_accept_ignores_empty_readings(self):
+        """check that a reading in which no digits were found keeps
+        the previous distance to go."""
+        tracker = DistanceTracker(model=None, templates=None)
+        self.assertEqual(None, tracker.accept(0.0))
+        self.assertEqual(131.5, tracker.accept(131.5))
+        for i in range(MAX_REJECTIONS + 1):
+            self.assertEqual(131.5, tracker.accept(0.0))
+        self.assertEqual(131.4, tracker.accept(131.4))
+
+    def test_reset_forgets_the_last_reading(self):
+        """check that after a reset, the next region is read and 
+        any reading is accepted."""
+        tracker = DistanceTracker(model=None, templates=None)
+        tracker.last_region = np.full((18, 52), 100, np.uint8)
+        self.assertEqual(131.5, tracker.accept(131.5))
+        tracker.reset()
+        self.assertFalse(tracker.region_matches(np.full((18, 52), 100, np.uint8)))
+        self.assertEqual(150.0, tracker.accept(150.0))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,151 @@
+"""Add parent directory to path"""
+import os,sys,inspect
+currentdir_loc = os.path.abspath(inspect.getfile(inspect.currentframe()))
+currentdir = os.path.dirname(currentdir_loc)
+parentdir = os.path.dirname(currentdir)
+sys.path.insert(0,parentdir)
+import csv
+import shutil
+import unittest
+import tempfile
+import numpy as np
+
+from boundaries import calc_hist, calc_hists, chi_square_distances
+from boundaries import find_frame_distances, boundaries_from_distances
+from boundaries import BoundaryDetector, HIST_BINS
+from boundaries import save_frame_distances, save_boundaries_from_distances
+from file_utils import get_paths
+
+def pixel_hist(frame):
+    """returns the normalized colour histogram of a bgr `frame`,
+    counting its pixels one at a time."""
+    hist = np.zeros((HIST_BINS, HIST_BINS, HIST_BINS))
+    for row in frame:
+        for b, g, r in row:
+            hist[int(b) * HIST_BINS // 256, int(g) * HIST_BINS // 256, 
+                 int(r) * HIST_BINS // 256] += 1
+    hist = hist.flatten()
+    return hist / np.sqrt(np.square(hist).sum())
+
+def scene_frames(scenes, seed=0):
+    """returns a list of (time, bgr frame) pairs, one frame per
+    second, showing each of the `scenes`, given as (colour, seconds),
+    as a noisy image of that colour."""
+    rng = np.random.RandomState(seed)
+    frames = []
+    for colour, seconds in scenes:
+        for _ in range(seconds):
+            time = '00:00:%02d:000' % len(frames)
+            noise = rng.randint(-40, 40, size=(96, 128, 3))
+            frame = np.clip(np.array(colour) + noise, 0, 255).astype(np.uint8)
+            frames.append((time, frame))
+    return frames
+
+class TestHistograms(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.RandomState(1)
+        self.frames = rng.randint(0, 256, size=(3, 12, 10, 3)).astype(np.uint8)
+
+    def test_calc_hists_matches_pixel_counts(self):
+        """check that each histogram matches one counted pixel by
+        pixel, including when only some of the pixels are used."""
+        hists = calc_hists(self.frames)
+        self.assertEqual((3, HIST_BINS ** 3), hists.shape)
+        for frame, hist in zip(self.frames, hists):
+            self.assertTrue(np.allclose(pixel_hist(frame), hist))
+        downscaled = calc_hists(self.frames, downscale=2)
+        for frame, hist in zip(self.frames, downscaled):
+            self.assertTrue(np.allclose(pixel_hist(frame[::2, ::2]), hist))
+
+    def test_calc_hists_matches_calc_hist(self):
+        """check that the batch histograms match those computed for
+        a single frame by opencv."""
+        hists = calc_hists(self.frames)
+        for frame, hist in zip(self.frames, hists):
+            self.assertTrue(np.allclose(calc_hist(frame), hist, atol=1e-6))
+
+    def test_chi_square_distances(self):
+        """check the distances between consecutive histograms, where
+        bins that are empty in the earlier histogram are skipped."""
+        hists = np.array([[0.5, 0.5, 0.0, 0.0],
+                          [0.25, 0.75, 0.0, 0.5],
+                          [0.0, 1.0, 0.0, 0.0],
+                          [0.0, 1.0, 0.0, 0.0]])
+        distances = chi_square_distances(hists)
+        self.assertTrue(np.allclose([0.25, 0.25 + 0.0625 / 0.75 + 0.5, 0.0], distances))
+        self.assertFalse(np.isnan(distances).any())
+        self.assertEqual(0, len(chi_square_distances(hists[:1])))
+
+class TestBoundaries(unittest.TestCase):
+
+    def setUp(self):
+        # a scene of six seconds, then one of three seconds, which
+        # is too short for the cut after it to start a new shot
+        self.frames = scene_frames([((200, 40, 40), 6), ((40, 200, 40), 3), 
+                                    ((40, 40, 200), 6)])
+
+    def test_boundaries_from_distances(self):
+        """check that a cut is found between the two scenes and that
+        a cut within MIN_SHOT_LENGTH of it is ignored."""
+        times, distances = find_frame_distances(iter(self.frames))
+        self.assertEqual(len(self.frames) - 1, len(distances))
+        self.assertEqual([5, 8], list(np.flatnonzero(distances > 5)))
+        self.assertEqual(['00:00:00:000', '00:00:06:000'],
+                         boundaries_from_distances(times, distances))
+        self.assertEqual([], boundaries_from_distances([], np.zeros(0)))
+
+    def test_blocks_do_not_change_distances(self):
+        """check that the distances are the same however the frames
+        are split into blocks."""
+        times, distances = find_frame_distances(iter(self.frames))
+        for block_size in (1, 3, 5):
+            blocked_times, blocked = find_frame_distances(iter(self.frames),
+                                                          block_size=block_size)
+            self.assertEqual(times, blocked_times)
+            self.assertTrue(np.allclose(distances, blocked))
+
+    def test_boundary_detector(self):
+        """check that the frame by frame detector finds the same
+        boundaries as the batch distances."""
+        detector = BoundaryDetector()
+        starts = [detector.update(time, frame) for time, frame in self.frames]
+        self.assertEqual([0, 6], list(np.flatnonzero(starts)))
+        times, distances = find_frame_distances(iter(self.frames))
+        self.assertEqual(boundaries_from_distances(times, distances),
+                         detector.shot_boundaries)
+
+class TestSavedDistances(unittest.TestCase):
+
+    def setUp(self):
+        self.root_path = tempfile.mkdtemp() + '/'
+        self.paths = get_paths(self.root_path, 1)
+        self.frames = scene_frames([((200, 40, 40), 6), ((40, 200, 40), 6)])
+
+    def tearDown(self):
+        shutil.rmtree(self.root_path)
+
+    def test_boundaries_from_saved_distances(self):
+        """check that the distances are saved (at full resolution)
+        on a fresh root and give the same boundaries."""
+        times, distances = save_frame_distances(self.root_path, 1, iter(self.frames))
+        data = np.load(self.paths['shot_distances'])
+        self.assertEqual(1, int(data['downscale']))
+        self.assertTrue(np.array_equal(distances, data['distances']))
+        save_boundaries_from_distances(self.root_path, 1)
+        with open(self.paths['shot_boundaries'], 'rb') as f:
+            shot_boundaries = [row[0] for row in csv.reader(f)]
+        self.assertEqual(boundaries_from_distances(times, distances), shot_boundaries)
+        self.assertEqual(['00:00:00:000', '00:00:06:000'], shot_boundaries)
+
+    def test_downscaled_distances_are_refused(self):
+        """check that the threshold is only applied to distances
+        computed with the downscale that it was chosen for."""
+        save_frame_distances(self.root_path, 1, iter(self.frames), downscale=2)
+        self.assertRaises(ValueError, save_boundaries_from_distances, self.root_path, 1)
+        self.assertFalse(os.path.exists(self.paths['shot_boundaries']))
+        save_boundaries_from_distances(self.root_path, 1, downscale=2)
+        self.assertTrue(os.path.exists(self.paths['shot_boundaries']))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+"""Add parent directory to path"""
+import os,sys,inspect
+currentdir_loc = os.path.abspath(inspect.getfile(inspect.currentframe()))
+currentdir = os.path.dirname(currentdir_loc)
+parentdir = os.path.dirname(currentdir)
+sys.path.insert(0,parentdir)
+import unittest
+import numpy as np
+
+from shots import group_detections_by_shot
+from detection_store import make_detections
+
+class TestGroupDetectionsByShot(unittest.TestCase):
+
+    def setUp(self):
+        box = (10, 10, 50, 50)
+        faces = [(500, 2.5, box), (600, 3.0, box), (700, np.nan, box),
+                 (1000, 2.5, box), (2100, 2.5, (-1, 10, 50, 50)),
+                 (6000, 2.5, box), (400, 2.5, box)]
+        self.detections = np.concatenate([make_detections(1, time_ms, [0], [box], [1.0], gradient)
+                                          for time_ms, gradient, box in faces])
+        self.boundaries = np.array([1000, 5000])
+
+    def test_groups_by_shot_and_gradient(self):
+        """check that the detections are grouped in order of shot
+        and then gradient, with unknown gradients grouped last."""
+        groups = group_detections_by_shot(self.detections, self.boundaries)
+        keys = [(int(shot_idx), gradient) for (shot_idx, gradient), _ in groups]
+        self.assertEqual([(0, 2.5), (0, 3.0), (1, 2.5), (2, 2.5)], keys[:2] + keys[3:])
+        self.assertEqual(0, keys[2][0])
+        self.assertTrue(np.isnan(keys[2][1]))
+        times = [list(group['time_ms']) for _, group in groups]
+        # a face at a boundary belongs to the shot that it starts
+        self.assertEqual([[500, 400], [600], [700], [1000], [6000]], times)
+
+    def test_invalid_boxes_are_dropped(self):
+        """check that detections with negative coordinates are
+        left out of every group."""
+        groups = group_detections_by_shot(self.detections, self.boundaries)
+        grouped = np.concatenate([group for _, group in groups])
+        self.assertEqual(len(self.detections) - 1, len(grouped))
+        self.assertFalse(2100 in grouped['time_ms'])
+        self.assertEqual([], group_detections_by_shot(self.detections[:0], self.boundaries))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+"""Add parent directory to path"""
+import os,sys,inspect
+currentdir_loc = os.path.abspath(inspect.getfile(inspect.currentframe()))
+currentdir = os.path.dirname(currentdir_loc)
+parentdir = os.path.dirname(currentdir)
+sys.path.insert(0,parentdir)
+import csv
+import shutil
+import unittest
+import tempfile
+import numpy as np
+
+from tracks import find_tracks, extract_face_tracks, MAX_TRACK_GAP
+from detection_store import make_detections, save_detections, face_name
+from file_utils import get_paths, ensure_dir
+from time_utils import format_milliseconds
+
+def detections(*faces):
+    """returns a table of detections, each face given as
+    (time_ms, box_idx, (x1, y1, x2, y2))."""
+    return np.concatenate([make_detections(1, time_ms, [box_idx], [box], [1.0], 2.5)
+                           for time_ms, box_idx, box in faces])
+
+def track_members(tracks):
+    """returns the (time_ms, box_idx) of the faces of each track."""
+    return [[(int(face['time_ms']), int(face['box_idx'])) for face in track.faces]
+            for track in tracks]
+
+class TestFindTracks(unittest.TestCase):
+
+    def test_track_gap_expiry(self):
+        """check that a face only extends a track that was
+        extended less than MAX_TRACK_GAP milliseconds ago."""
+        box = (0, 0, 10, 10)
+        close = find_tracks(detections((0, 0, box), (MAX_TRACK_GAP - 1, 0, box)))
+        self.assertEqual([[(0, 0), (MAX_TRACK_GAP - 1, 0)]], track_members(close))
+        expired = find_tracks(detections((0, 0, box), (MAX_TRACK_GAP, 0, box)))
+        self.assertEqual([[(0, 0)], [(MAX_TRACK_GAP, 0)]], track_members(expired))
+        # an expired track is not revived by a later face
+        faces = detections((0, 0, box), (MAX_TRACK_GAP, 1, (50, 50, 60, 60)),
+                           (MAX_TRACK_GAP + 40, 0, box))
+        self.assertEqual(3, len(find_tracks(faces)))
+
+    def test_first_match_order(self):
+        """check that a face matching several tracks joins the
+        one that was started first."""
+        faces = detections((0, 1, (8, 0, 18, 10)), (0, 0, (0, 0, 10, 10)),
+                           (40, 0, (7, 2, 11, 6)))
+        tracks = find_tracks(faces)
+        # detections are sorted by time and box index first
+        self.assertEqual([[(0, 0), (40, 0)], [(0, 1)]], track_members(tracks))
+
+    def test_max_history(self):
+        """check that a face is only compared with the last
+        `max_history` boxes of each track."""
+        faces = detections((0, 0, (0, 0, 10, 10)), (40, 0, (4, 0, 14, 10)),
+                           (80, 0, (-4, 0, 6, 10)))
+        self.assertEqual(1, len(find_tracks(faces, max_history=2)))
+        tracks = find_tracks(faces, max_history=1)
+        self.assertEqual([[(0, 0), (40, 0)], [(80, 0)]], track_members(tracks))
+
+    def test_disjoint_boxes(self):
+        """check that faces which do not overlap (or have no
+        area) start their own tracks."""
+        faces = detections((0, 0, (0, 0, 10, 10)), (0, 1, (20, 20, 30, 30)),
+                           (40, 0, (10, 10, 20, 20)), (40, 1, (25, 25, 25, 25)))
+        tracks = find_tracks(faces)
+        self.assertEqual([[(0, 0)], [(0, 1)], [(40, 0)], [(40, 1)]],
+                         track_members(tracks))
+        self.assertEqual([], find_tracks(detections((0, 0, (0, 0, 1, 1)))[:0]))
+
+class TestExtractFaceTracks(unittest.TestCase):
+
+    def setUp(self):
+        self.root_path = tempfile.mkdtemp() + '/'
+        self.paths = get_paths(self.root_path, 1)
+        ensure_dir(os.path.dirname(self.paths['shot_boundaries']))
+        with open(self.paths['shot_boundaries'], 'w') as f:
+            f.write('00:00:01\n')
+        # the faces at 900 and 960 ms form a track in the first shot,
+        # the face at 940 ms has an unknown gradient and the face at
+        # 1000 ms is in the second shot
+        self.detections = detections((900, 0, (0, 0, 10, 10)), (940, 0, (1, 1, 11, 11)),
+                                     (1000, 0, (0, 0, 10, 10)))
+        self.detections['gradient'][1] = np.nan
+        self.detections = np.concatenate([self.detections, 
+                                          detections((960, 1, (2, 2, 12, 12)))])
+        ensure_dir(self.paths['faces'])
+        for detection in self.detections:
+            with open(self.face_path(self.paths['faces'], detection), 'w') as f:
+                f.write(str(detection['time_ms']))
+
+    def tearDown(self):
+        shutil.rmtree(self.root_path)
+
+    def face_path(self, root, detection):
+        """returns the path of the face image of `detection`."""
+        time = format_milliseconds([detection['time_ms']])[0]
+        return face_name(root, detection['stage'], time, detection['box_idx'], 
+                         detection['gradient'])
+
+    def test_manifest(self):
+        """check that the tracks are split by shot and gradient and
+        written to the manifest, without linking any faces."""
+        rows = extract_face_tracks(self.root_path, 1, self.detections)
+        self.assertEqual([(1, '00:00:00:900', 0), (1, '00:00:00:960', 1), 
+                          (2, '00:00:00:940', 0), (3, '00:00:01:000', 0)],
+                         [(row[0], row[2], row[3]) for row in rows])
+        with open(self.paths['track_manifest'], 'rb') as f:
+            manifest = list(csv.reader(f))
+        self.assertEqual(['track', 'stage', 'time', 'box_idx', 'gradient', 
+                          'x1', 'y1', 'x2', 'y2'], manifest[0])
+        self.assertEqual([[str(value) for value in row] for row in rows], manifest[1:])
+        self.assertFalse(os.path.exists(self.paths['face_tracks']))
+
+    def test_link_faces(self):
+        """check that the faces of each track are linked into its
+        directory, using the stored detections by default."""
+        save_detections(self.paths['detections'], [self.detections])
+        rows = extract_face_tracks(self.root_path, 1, link_faces=True)
+        self.assertEqual(4, len(rows))
+        self.assertEqual(['1', '2', '3'], sorted(os.listdir(self.paths['face_tracks'])))
+        self.assertEqual(2, len(os.listdir(self.paths['face_tracks'] + '1/')))
+        for detection in self.detections:
+            src = self.face_path(self.paths['faces'], detection)
+            track_idx = [row[0] for row in rows 
+                         if row[2] == format_milliseconds([detection['time_ms']])[0]][0]
+            dest = self.face_path(self.paths['face_tracks'] + str(track_idx) + '/', 
+                                  detection)
+            self.assertTrue(os.path.samefile(src, dest))
+        # linking again replaces the existing links
+        extract_face_tracks(self.root_path, 1, link_faces=True)
+        self.assertEqual(2, len(os.listdir(self.paths['face_tracks'] + '1/')))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -9,6 +9,10 @@ import numpy as np
 
 from sharpness_rank import focus_on_center
 from sharpness_rank import high_pass_filter
+from sharpness_rank import crop_batch
+from sharpness_rank import score_batch
+from sharpness_rank import batch_sharpness_with_LoG
+from sharpness_rank import calculate_sharpness_with_LoG
 
 class TestSnapshotCluster(unittest.TestCase):
 
@@ -32,6 +36,29 @@ class TestSnapshotCluster(unittest.TestCase):
         for elem in np.nditer(lower_freqs):
             self.assertTrue(elem < 0.00001)
 
+    def test_batch_LoG_matches_single_images(self):
+        """check that scoring a batch gives the same LoG scores
+        as scoring each image on its own."""
+        rng = np.random.RandomState(0)
+        imgs = (rng.rand(4, 60, 80) * 255).astype(np.uint8)
+        expected = [calculate_sharpness_with_LoG(focus_on_center(img, 0.7), 3)
+                    for img in imgs]
+        scores = batch_sharpness_with_LoG(crop_batch(imgs), 3)
+        self.assertEqual(expected, list(scores))
+
+    def test_score_batch_prefers_detailed_image(self):
+        """check that each metric scores a noisy image above
+        a flat one."""
+        rng = np.random.RandomState(1)
+        flat = np.full((60, 80), 128, np.uint8)
+        noisy = (rng.rand(60, 80) * 255).astype(np.uint8)
+        batch = np.array([flat, noisy, flat])
+        for metric in ['LoG', 'fft', 'laplacian_variance']:
+            scores = score_batch(batch, metric=metric)
+            self.assertEqual(1, np.argmax(scores))
+        scores = score_batch(batch, downscale=2, keep=1)
+        self.assertEqual(1, np.argmax(scores))
+
 if __name__ == "__main__":
     unittest.main()
 
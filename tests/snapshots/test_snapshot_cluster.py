@@ -11,6 +11,8 @@ from time_utils import time_cluster
 from time_utils import offset_time
 from time_utils import ensure_two_digits
 from time_utils import ensure_three_digits
+from snapshot_cluster import get_cluster_pairs
+from snapshot_cluster import split_into_chunks
 
 
 class TestSnapshotCluster(unittest.TestCase):
@@ -92,5 +94,26 @@ class TestSnapshotCluster(unittest.TestCase):
         self.assertEqual(expected_num2, ensure_three_digits(num2))
         self.assertEqual(expected_num3, ensure_three_digits(num3))
 
+    def test_get_cluster_pairs(self):
+        """check that get_cluster_pairs returns the clusters 
+        around each target in time order."""
+        targets = ["00:02:20:000", "00:02:20:300"]
+        pairs = get_cluster_pairs(targets, cluster_size=3, max_offset=200)
+        expected_pairs = [("00:02:19:800", "00:02:20:000"),
+                          ("00:02:20:000", "00:02:20:000"),
+                          ("00:02:20:100", "00:02:20:300"),
+                          ("00:02:20:200", "00:02:20:000"),
+                          ("00:02:20:300", "00:02:20:300"),
+                          ("00:02:20:500", "00:02:20:300")]
+        self.assertEqual(expected_pairs, pairs)
+
+    def test_split_into_chunks(self):
+        """check that split_into_chunks keeps chunks contiguous
+        and never returns empty chunks."""
+        targets = ['a', 'b', 'c', 'd', 'e']
+        self.assertEqual([['a', 'b', 'c'], ['d', 'e']], 
+                         split_into_chunks(targets, 2))
+        self.assertEqual([['a'], ['b']], split_into_chunks(['a', 'b'], 4))
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,73 @@
+"""Add parent directory to path"""
+import os,sys,inspect
+currentdir_loc = os.path.abspath(inspect.getfile(inspect.currentframe()))
+currentdir = os.path.dirname(currentdir_loc)
+parentdir = os.path.dirname(currentdir)
+sys.path.insert(0,parentdir) 
+import unittest
+import shutil
+import tempfile
+
+from detection_store import make_detections
+from detection_store import save_detections
+from detection_store import load_detections
+from detection_store import box_dict, face_name
+from time_utils import format_milliseconds
+
+def detection_corners(detection):
+    return tuple(int(detection[key]) for key in ['x1', 'y1', 'x2', 'y2'])
+
+class TestDetectionStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'meta', 'Stage3.npz')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_detections_round_trip_in_time_order(self):
+        """check that detections saved frame by frame are loaded
+        as a single table ordered by time."""
+        later = make_detections('3', 65000, [2], [(10, 20, 60, 80)], [0.9], -1.5)
+        earlier = make_detections('3', 1250, [0, 3], [(1, 2, 3, 4), (5, 6, 7, 8)], 
+                                  [0.7, 0.8], 4.0)
+        save_detections(self.path, [later, earlier])
+        detections = load_detections(self.path)
+        self.assertEqual([1250, 1250, 65000], list(detections['time_ms']))
+        self.assertEqual([0, 3, 2], list(detections['box_idx']))
+        self.assertEqual(3, detections['stage'][0])
+        self.assertEqual(-1.5, detections['gradient'][2])
+        expected_box = {'top_left_x': 10, 'top_left_y': 20,
+                        'bottom_right_x': 60, 'bottom_right_y': 80}
+        self.assertEqual(expected_box, box_dict(detections[2]))
+
+    def test_skipped_box_resolves_to_its_crop(self):
+        """check that when a low scoring box is skipped, the boxes
+        after it still resolve (through `face_name`) to their own
+        crops, which are named by their index among all boxes."""
+        boxes = [(1, 2, 3, 4), (5, 6, 7, 8), (9, 10, 11, 12)]
+        scores = [0.9, 0.2, 0.8]
+        confident_idxs = [i for i in range(len(boxes)) if scores[i] > 0.5]
+        faces_dir = self.tmp_dir + '/faces/'
+        os.makedirs(faces_dir)
+        for i in confident_idxs:
+            with open(face_name(faces_dir, 3, '00:00:01:250', i, 4.0), 'w') as f:
+                f.write(str(boxes[i]))
+        detections = make_detections('3', 1250, confident_idxs, 
+                                     [boxes[i] for i in confident_idxs],
+                                     [scores[i] for i in confident_idxs], 4.0)
+        save_detections(self.path, [detections])
+        for detection in load_detections(self.path):
+            time = format_milliseconds([detection['time_ms']])[0]
+            path = face_name(faces_dir, detection['stage'], time, 
+                             detection['box_idx'], detection['gradient'])
+            with open(path) as f:
+                self.assertEqual(str(detection_corners(detection)), f.read())
+
+    def test_face_name(self):
+        name = face_name('faces/', 3, '00:01:05:000', 2, -1.5)
+        self.assertEqual('faces/3-00:01:05:000:2:-1.5.jpg', name)
+
+if __name__ == "__main__":
+    unittest.main()
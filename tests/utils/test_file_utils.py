@@ -0,0 +1,68 @@
+"""Add parent directory to path"""
+import os,sys,inspect
+currentdir_loc = os.path.abspath(inspect.getfile(inspect.currentframe()))
+currentdir = os.path.dirname(currentdir_loc)
+parentdir = os.path.dirname(currentdir)
+sys.path.insert(0,parentdir)
+import unittest
+import shutil
+import tempfile
+
+from file_utils import get_paths, ensure_dir
+from file_utils import get_jpgs_in_dir, get_img_paths_in_dir
+
+class TestStageContext(unittest.TestCase):
+
+    def setUp(self):
+        self.root_path = tempfile.mkdtemp() + '/'
+        os.makedirs(self.root_path + 'gradient_data')
+        calibration_path = self.root_path + 'gradient_data/stage_calibrations.csv'
+        with open(calibration_path, 'w') as f:
+            f.write('0,0.5\n1,1.25\n2,-3.0\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.root_path)
+
+    def test_paths_are_computed_without_creating_directories(self):
+        """check that no directories are created until a
+        writer asks for them."""
+        paths = get_paths(self.root_path, 2)
+        self.assertEqual(paths['tete'], self.root_path + 'tete_frames/2/')
+        self.assertEqual(os.listdir(self.root_path), ['gradient_data'])
+        self.assertEqual(ensure_dir(paths['tete']), paths['tete'])
+        self.assertTrue(os.path.isdir(paths['tete']))
+
+    def test_removed_directories_are_recreated(self):
+        """check that each context only creates a directory once,
+        and that a new context recreates one that was removed."""
+        paths = get_paths(self.root_path, 2)
+        self.assertEqual(paths.ensure_dir(paths['faces']), paths['faces'])
+        self.assertTrue(os.path.isdir(paths['faces']))
+        shutil.rmtree(paths['faces'])
+        paths.ensure_dir(paths['faces'])
+        self.assertFalse(os.path.isdir(paths['faces']))
+        ensure_dir(paths['faces'])
+        self.assertTrue(os.path.isdir(paths['faces']))
+        shutil.rmtree(paths['faces'])
+        paths = get_paths(self.root_path, 2)
+        paths.ensure_dir(paths['faces'])
+        self.assertTrue(os.path.isdir(paths['faces']))
+
+    def test_readers_accept_missing_directories(self):
+        """check that the frame readers find no images in
+        directories that have not been created yet."""
+        paths = get_paths(self.root_path, 2)
+        self.assertEqual((paths['tete'], []), get_jpgs_in_dir(paths['tete']))
+        self.assertEqual([], get_img_paths_in_dir(paths['dense_tete']))
+
+    def test_offset_is_read_lazily(self):
+        """check that the calibration offset is only looked up
+        when it is first used."""
+        paths = get_paths(self.root_path, 1)
+        self.assertFalse('offset' in paths)
+        self.assertEqual(paths['offset'], 1.25)
+        self.assertEqual(get_paths(self.root_path, 2)['offset'], -3.0)
+        self.assertRaises(KeyError, lambda: paths['missing'])
+
+if __name__ == '__main__':
+    unittest.main()
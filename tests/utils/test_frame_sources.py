@@ -0,0 +1,48 @@
+"""Add parent directory to path"""
+import os,sys,inspect
+currentdir_loc = os.path.abspath(inspect.getfile(inspect.currentframe()))
+currentdir = os.path.dirname(currentdir_loc)
+parentdir = os.path.dirname(currentdir)
+sys.path.insert(0,parentdir) 
+import unittest
+import shutil
+import tempfile
+import numpy as np
+import cv2
+
+from frame_sources import VideoFrames
+from frame_sources import DirectoryFrames
+from frame_sources import SavedFrames
+
+class TestFrameSources(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp() + '/'
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_saved_frames_round_trip(self):
+        """check that SavedFrames passes frames through unchanged
+        and that DirectoryFrames reads them back in time order."""
+        times = ['00:00:01:000', '00:00:00:000']
+        frames = [(time, np.zeros((20, 30, 3), np.uint8)) for time in times]
+        passed = list(SavedFrames(frames, self.tmp_dir, 8))
+        self.assertEqual(times, [time for time, frame in passed])
+        loaded = list(DirectoryFrames(self.tmp_dir, grayscale=True))
+        self.assertEqual(sorted(times), [time for time, img in loaded])
+        self.assertEqual((20, 30), loaded[0][1].shape)
+
+    def test_video_frames_select(self):
+        """check that a selection of video frames keeps the source
+        and options of the frames it is taken from."""
+        frames = VideoFrames('Stage8.m4v', ['00:00:01:000', '00:00:02:000'], 
+                             dimensions={'width': 32, 'height': 18}, grayscale=True)
+        selected = frames.select(['00:00:02:000'])
+        self.assertEqual(['00:00:02:000'], selected.times)
+        self.assertEqual(1, len(selected))
+        self.assertEqual(('Stage8.m4v', {'width': 32, 'height': 18}, True),
+                         (selected.src_video, selected.dimensions, selected.grayscale))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -5,12 +5,37 @@ currentdir = os.path.dirname(currentdir_loc)
 parentdir = os.path.dirname(currentdir)
 sys.path.insert(0,parentdir) 
 import unittest
+import shutil
+import tempfile
+import matplotlib
+matplotlib.use('Agg')
+import cv2
 import numpy as np
 
 from image_utils import crop_frame
 from image_utils import border_rectangle
 from image_utils import get_fig_dimensions
 from image_utils import crop_to_scaled_region
+from image_utils import top_border, white_divider
+from image_utils import threshold_image, find_contours
+from image_utils import apply_threshold_to_image
+from file_utils import is_img_name
+from digit_classifier import create_test_fig, render_region
+from digit_classifier import extract_digit_rois
+
+TEST_IMAGES_DIR = os.path.join(os.path.dirname(parentdir), 'ocr', 'data', 'test_images')
+REFERENCE_FIGURE = os.path.join(os.path.dirname(parentdir), 'ocr', 'data', 
+                                'test_figures', 'current_fig.jpg')
+# the digits of the 'km to go' sign, which is drawn in the same 
+# place in each of the test images
+DIGIT_REGION = {'top_left_x': 166, 'top_left_y': 17, 
+                'bottom_right_x': 218, 'bottom_right_y': 35}
+
+def framed_region(binary_img):
+    """returns the part of `binary_img` inside the grey border."""
+    border = max(find_contours(binary_img.copy()), key=cv2.contourArea)
+    x, y, w, h = cv2.boundingRect(border)
+    return binary_img[y:y+h, x:x+w]
 
 class TestUtils(unittest.TestCase):
 
@@ -55,6 +80,52 @@ class TestUtils(unittest.TestCase):
         dims = cropped_img.shape
         self.assertEqual(expected_dims, dims)
 
+class TestRenderDigitRegion(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.paths = {'test_figures': self.tmp_dir + '/'}
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def figure_region(self, km_img):
+        """returns the binarized matplotlib figure of `km_img`."""
+        top = top_border(km_img)
+        divider = white_divider(km_img)
+        rectangle = border_rectangle(km_img)
+        create_test_fig(km_img, top, rectangle, divider, self.paths)
+        return apply_threshold_to_image(self.paths['test_figures'] + 'current_fig.jpg')
+
+    def test_render_matches_figure(self):
+        """check that the in-memory render of each test image 
+        binarizes to the same digits as the matplotlib figure."""
+        img_names = sorted(name for name in os.listdir(TEST_IMAGES_DIR) if is_img_name(name))
+        self.assertTrue(img_names)
+        for img_name in img_names:
+            img = cv2.imread(os.path.join(TEST_IMAGES_DIR, img_name), cv2.IMREAD_GRAYSCALE)
+            km_img = crop_frame(img, DIGIT_REGION)
+            expected = framed_region(self.figure_region(km_img))
+            rendered = framed_region(threshold_image(render_region(km_img)))
+            self.assertEqual(expected.shape, rendered.shape)
+            self.assertLess(np.mean(expected != rendered), 0.03)
+            expected_rois, expected_contours = extract_digit_rois(expected)
+            rendered_rois, rendered_contours = extract_digit_rois(rendered)
+            expected_heights = sorted(cv2.boundingRect(c)[3] for c in expected_contours)
+            rendered_heights = sorted(cv2.boundingRect(c)[3] for c in rendered_contours)
+            self.assertEqual(len(expected_heights), len(rendered_heights))
+            for height, other in zip(expected_heights, rendered_heights):
+                self.assertAlmostEqual(height, other, delta=2)
+
+    def test_render_matches_reference_figure(self):
+        """check that the digit region is rendered at the scale of
+        the reference figure that the classifier was built on."""
+        reference = apply_threshold_to_image(REFERENCE_FIGURE)
+        img = cv2.imread(os.path.join(TEST_IMAGES_DIR, 'test1.jpg'), cv2.IMREAD_GRAYSCALE)
+        rendered = threshold_image(render_region(crop_frame(img, DIGIT_REGION)))
+        self.assertEqual(reference.shape[1], rendered.shape[1])
+        self.assertEqual(framed_region(reference).shape[1], 
+                         framed_region(rendered).shape[1])
 
 if __name__ == "__main__":
     unittest.main()
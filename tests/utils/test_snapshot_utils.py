@@ -8,6 +8,9 @@ import unittest
 import numpy as np
 
 from snapshot_utils import clean_msg
+from snapshot_utils import frame_index
+from snapshot_utils import snapshot_name
+from snapshot_utils import split_into_runs
 
 class TestUtils(unittest.TestCase):
     
@@ -19,5 +22,29 @@ class TestUtils(unittest.TestCase):
         cleaned = clean_msg(sample)
         self.assertEqual(expected, cleaned)
 
+    def test_frame_index(self):
+        """check that frame_index finds the frame displayed 
+        closest to the given time."""
+        fps = 25.0
+        self.assertEqual(0, frame_index('00:00:00:000', fps))
+        self.assertEqual(25, frame_index('00:00:01:000', fps))
+        self.assertEqual(26, frame_index('00:00:01:030', fps))
+        self.assertEqual(90000, frame_index('01:00:00:000', fps))
+
+    def test_split_into_runs(self):
+        """check that split_into_runs only starts a new run
+        when the gap between frames is too large."""
+        frame_idxs = [0, 25, 50, 1000, 1025, 5000]
+        expected_runs = [[0, 1, 2], [3, 4], [5]]
+        runs = split_into_runs(frame_idxs, max_gap=500)
+        self.assertEqual(expected_runs, runs)
+
+    def test_snapshot_name(self):
+        """check that snapshot_name preserves the 
+        {stage_id}-HH:MM:SS:MMM.jpg naming scheme."""
+        expected = '/precis/8-00:02:20:000.jpg'
+        name = snapshot_name('/precis/', 8, '00:02:20:000')
+        self.assertEqual(expected, name)
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -12,6 +12,9 @@ from time_utils import get_contiguous_intervals
 from time_utils import time_cluster, ensure_two_digits
 from time_utils import get_num_frames, ensure_three_digits
 from time_utils import time_to_seconds, seconds_to_time
+from time_utils import times_to_milliseconds, format_milliseconds
+from time_utils import expand_intervals, cluster_milliseconds
+from time_utils import find_contiguous_intervals
 
 class TestTimeUtils(unittest.TestCase):
 
@@ -166,5 +169,42 @@ class TestTimeUtils(unittest.TestCase):
         intervals3 = get_contiguous_intervals(times3)
         self.assertEqual(expected_intervals3, intervals3)
 
+    def test_times_to_milliseconds(self):
+        """check that times_to_milliseconds parses times both 
+        with and without milliseconds."""
+        times = ['00:00:01:250', '01:02:03', '03:54:08:999']
+        expected = [1250, 3723000, 14048999]
+        self.assertEqual(expected, list(times_to_milliseconds(times)))
+
+    def test_format_milliseconds(self):
+        """check that format_milliseconds produces times of 
+        the format HH:MM:SS:MMM."""
+        milliseconds = np.array([0, 1250, 3723000, 14048999])
+        expected = ['00:00:00:000', '00:00:01:250', 
+                    '01:02:03:000', '03:54:08:999']
+        self.assertEqual(expected, format_milliseconds(milliseconds))
+
+    def test_expand_intervals(self):
+        """check that expand_intervals includes the first time 
+        past the end of each interval (like get_times_in_interval)."""
+        times = expand_intervals([1000, 5000], [2000, 5000], 500)
+        expected = [1000, 1500, 2000, 2500, 5000, 5500]
+        self.assertEqual(expected, list(times))
+
+    def test_cluster_milliseconds(self):
+        """check that cluster_milliseconds returns one row 
+        for each time."""
+        clusters = cluster_milliseconds([1000, 5000], size=3, max_offset=100)
+        expected = [[900, 1000, 1100], [4900, 5000, 5100]]
+        self.assertEqual(expected, clusters.tolist())
+
+    def test_find_contiguous_intervals(self):
+        """check that find_contiguous_intervals splits times at 
+        gaps of more than a second."""
+        milliseconds = [61000, 62000, 62500, 64000]
+        starts, stops = find_contiguous_intervals(milliseconds)
+        self.assertEqual([61000, 64000], list(starts))
+        self.assertEqual([62000, 64000], list(stops))
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
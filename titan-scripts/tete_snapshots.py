@@ -9,11 +9,17 @@ as an input argument to define the stage number."""
 stage = sys.argv[1]
 stage_id = str(stage)
 
+"""the (optional) second argument sets the number of 
+worker processes used to classify the camera states and
+extract the snapshot clusters."""
+workers = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+
 """First extract  the camera focus for each stage"""
 camera_focus = CameraFocus(root_path, stage_id)
-camera_focus.get_camera_states()
+camera_focus.get_camera_states(workers=workers)
 camera_focus.save_camera_states()
 
-"""set the Display Aspect Ratio for snapshots."""
+"""set the Display Aspect Ratio for snapshots. Only the sharpest
+frame of each cluster is written to disk."""
 step = 500 # in milliseconds
-extract_tete_snapshots(root_path, stage_id, step)
+extract_tete_snapshots(root_path, stage_id, step, workers, fused=True)
@@ -0,0 +1,61 @@
+import os
+import numpy as np
+
+from file_utils import ensure_dir
+
+# one row for each confident face detection.  `box_idx` is the index
+# of the box among all of the detections made in its frame.
+DETECTION_DTYPE = np.dtype([('stage', np.int32),
+                            ('time_ms', np.int64),
+                            ('box_idx', np.int32),
+                            ('x1', np.int32),
+                            ('y1', np.int32),
+                            ('x2', np.int32),
+                            ('y2', np.int32),
+                            ('score', np.float32),
+                            ('gradient', np.float64)])
+
+def make_detections(stage_id, time_ms, box_idxs, boxes, scores, gradient):
+    """returns a structured array of detections made in a single
+    frame, where each of `boxes` is a tuple (x1, y1, x2, y2)."""
+    detections = np.zeros(len(box_idxs), dtype=DETECTION_DTYPE)
+    detections['stage'] = int(stage_id)
+    detections['time_ms'] = time_ms
+    detections['box_idx'] = box_idxs
+    for idx, key in enumerate(['x1', 'y1', 'x2', 'y2']):
+        detections[key] = [box[idx] for box in boxes]
+    detections['score'] = scores
+    detections['gradient'] = gradient
+    return detections
+
+def sort_detections(detections):
+    """returns the detections ordered by time and box index."""
+    return np.sort(detections, order=['time_ms', 'box_idx'])
+
+def save_detections(path, detection_arrays):
+    """saves the given arrays of detections (e.g. one per frame)
+    to `path` as a single .npz table in time order."""
+    if detection_arrays:
+        detections = np.concatenate(detection_arrays)
+    else:
+        detections = np.zeros(0, dtype=DETECTION_DTYPE)
+    ensure_dir(os.path.dirname(path))
+    np.savez(path, detections=sort_detections(detections))
+
+def load_detections(path):
+    """returns the table of detections saved at `path`."""
+    return np.load(path)['detections']
+
+def box_dict(detection):
+    """returns the bounding vertices of a detection in the
+    dictionary format used by `crop_frame`."""
+    return {'top_left_x': int(detection['x1']),
+            'top_left_y': int(detection['y1']),
+            'bottom_right_x': int(detection['x2']),
+            'bottom_right_y': int(detection['y2'])}
+
+def face_name(root, stage_id, time, box_idx, gradient):
+    """returns the path of the image of a detected face, where
+    `time` is given in the format HH:MM:SS:MMM."""
+    return (root + str(stage_id) + '-' + time + ':'
+            + str(box_idx) + ':' + str(gradient) + '.jpg')
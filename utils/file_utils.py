@@ -1,54 +1,103 @@
 import os
 import csv
 
+# the offsets of each stage in stage_calibrations.csv, keyed by root path
+_CALIBRATIONS = {}
+
+class StageContext(dict):
+    """The paths used to process a stage.  The paths are computed
+    without touching the filesystem: the calibration `offset` is only
+    read when it is first looked up, and the directories are created
+    by the writers that need them (see `ensure_dir`)."""
+
+    def __init__(self, root_path, stage_id):
+        dict.__init__(self)
+        self.root_path = root_path
+        self.stage_id = stage_id
+        # the directories this context has already ensured exist
+        self.created_dirs = set()
+        stage_str = str(stage_id)
+        self['tete'] = root_path + 'tete_frames/' + stage_str + '/'
+        self['dense_tete'] = root_path + 'dense_tete_frames/' + stage_str + '/'
+        self['log'] = root_path + 'camera_states/' + stage_str + '.pickle'
+        self['camera_features'] = root_path + 'camera_states/' + stage_str + '.sqlite'
+        self['precis'] = root_path + 'precis_frames/' + stage_str + '/'
+        self['src_video'] = root_path + 'raw/Stage' + stage_str +'.m4v'
+        self['tmp_clusters'] = root_path + 'tmp_clusters/' + stage_str + '/'
+        self['faces'] = root_path + 'faces_with_gradients/' + stage_str + '/'
+        self['templates'] = root_path + 'templates/'
+        self['fused'] = root_path + 'ocr/fused/'
+        self['digit_model'] = root_path + 'ocr/model/'
+        self['test_figures'] = root_path + 'ocr/test_figures/' + stage_str + '/'
+        self['dlib_detector'] = root_path + 'dlib/cyclist_detector.svm'
+        self['digit_training_frames'] = root_path + 'ocr/digit_frames/training/'
+        self['digit_testing_frames'] = root_path + 'ocr/digit_frames/testing/'
+        self['strava'] = root_path + 'gradient_data/raw/Stage' + stage_str + ".tcx"
+        self['gradient_profile'] = root_path + 'gradient_data/profiles/Stage' + stage_str + '.npz'
+        self['detections'] = root_path + 'meta/Stage' + stage_str + '.npz'
+        self['shot_boundaries'] = root_path + 'shot_boundaries/Stage' + stage_str + '.csv'
+        self['shot_distances'] = root_path + 'shot_boundaries/Stage' + stage_str + '_distances.npz'
+        self['face_shots'] = root_path + 'face_shots/' + stage_str + '/'
+        self['face_tracks'] = root_path + 'face_tracks/' + stage_str + '/'
+        self['track_manifest'] = root_path + 'face_tracks/Stage' + stage_str + '.csv'
+        self['stage'] = stage_str    
+        self['annotations'] = root_path + 'camera_annotations/Stage' + stage_str + '.csv'
+
+    def __missing__(self, key):
+        """looks up the calibration offset the first time it 
+        is needed."""
+        if key != 'offset':
+            raise KeyError(key)
+        self['offset'] = find_offset(self.root_path, self.stage_id)
+        return self['offset']
+
+    def ensure_dir(self, target_dir):
+        """returns `target_dir`, creating it if needed.  The filesystem
+        is only checked the first time this context asks for each 
+        directory, so a new context recreates any that were removed."""
+        if target_dir not in self.created_dirs:
+            ensure_dir(target_dir)
+            self.created_dirs.add(target_dir)
+        return target_dir
+
 def get_paths(root_path, stage_id):
-    """returns all required paths and ensures that 
-    the path to each defirectory is valid."""
-    paths = {}
-    stage_str = str(stage_id)
-    paths['tete'] = root_path + 'tete_frames/' + stage_str + '/'
-    paths['dense_tete'] = root_path + 'dense_tete_frames/' + stage_str + '/'
-    paths['log'] = root_path + 'camera_states/' + stage_str + '.pickle'
-    paths['precis'] = root_path + 'precis_frames/' + stage_str + '/'
-    paths['src_video'] = root_path + 'raw/Stage' + stage_str +'.m4v'
-    paths['tmp_clusters'] = root_path + 'tmp_clusters/' + stage_str + '/'
-    paths['faces'] = root_path + 'faces_with_gradients/' + stage_str + '/'
-    paths['templates'] = root_path + 'templates/'
-    paths['fused'] = root_path + 'ocr/fused/'
-    paths['digit_model'] = root_path + 'ocr/model/'
-    paths['test_figures'] = root_path + 'ocr/test_figures/' + stage_str + '/'
-    paths['dlib_detector'] = root_path + 'dlib/cyclist_detector.svm'
-    paths['digit_training_frames'] = root_path + 'ocr/digit_frames/training/'
-    paths['digit_testing_frames'] = root_path + 'ocr/digit_frames/testing/'
-    paths['strava'] = root_path + 'gradient_data/raw/Stage' + stage_str + ".tcx"
-    paths['offset'] = find_offset(root_path, stage_id)
-    paths['meta'] = root_path + 'meta/Stage' + stage_str + '.csv'
-    paths['shot_boundaries'] = root_path + 'shot_boundaries/Stage' + stage_str + '.csv'
-    paths['face_shots'] = root_path + 'face_shots/' + stage_str + '/'
-    paths['face_tracks'] = root_path + 'face_tracks/' + stage_str + '/'
-    paths['stage'] = stage_str    
-    paths['annotations'] = root_path + 'camera_annotations/Stage' + stage_str + '.csv'
-    directories = ['tete', 'dense_tete', 'precis', 'faces', 'tmp_clusters', 'templates', 'fused', 
-                   'digit_model', 'test_figures', 'digit_training_frames', 'face_shots', 'face_tracks']
-    for key in directories:
-        if not os.path.exists(paths[key]):
-            os.makedirs(paths[key]) 
-    return paths
+    """returns all required paths (as a `StageContext`), without 
+    creating any directories."""
+    return StageContext(root_path, stage_id)
+
+def ensure_dir(target_dir):
+    """ensures that target_dir exists and returns it."""
+    if not os.path.isdir(target_dir):
+        try:
+            os.makedirs(target_dir)
+        except OSError:
+            # created by another process in the meantime
+            if not os.path.isdir(target_dir):
+                raise
+    return target_dir
+
+def load_calibrations(root_path):
+    """returns the calibration offset of every stage, reading
+    stage_calibrations.csv once per process."""
+    if root_path not in _CALIBRATIONS:
+        calibration_path = root_path + 'gradient_data/stage_calibrations.csv'
+        with open(calibration_path, 'rU') as csvfile:
+            reader = csv.reader(csvfile)
+            _CALIBRATIONS[root_path] = [row[-1] for row in reader]
+    return _CALIBRATIONS[root_path]
 
 def find_offset(root_path, stage_id):
     """returns the offset that calibrates gps data with 
     official Tdf distances."""
-    calibration_path = root_path + 'gradient_data/stage_calibrations.csv'
-    with open(calibration_path, 'rU') as csvfile:
-        reader = csv.reader(csvfile)
-        offsets = [row[-1] for row in reader]
+    offsets = load_calibrations(root_path)
     return float(offsets[int(stage_id)])
 
 def get_jpgs_in_dir(image_dir):
     """returns list of the .jpg files in the given
-    directory, together with the root path."""
+    directory, together with the root path (the directory
+    itself if it has not been created yet)."""
     frames = []
-    root = None
+    root = image_dir
     for root, dirs, fnames in os.walk(image_dir):
         for fname in fnames:
             if is_img_name(fname):
@@ -70,6 +119,4 @@ def is_img_name(fname):
 
 def get_target_dir(path, selected_time):
     target_dir = path + selected_time + '/'
-    if not os.path.exists(target_dir):
-        os.makedirs(target_dir)
-    return target_dir
+    return ensure_dir(target_dir)
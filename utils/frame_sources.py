@@ -0,0 +1,72 @@
+import cv2
+
+from file_utils import get_img_paths_in_dir
+from time_utils import get_time_from_path
+from snapshot_utils import stream_frames
+from snapshot_utils import resize_frame
+from snapshot_utils import save_frame
+
+class VideoFrames:
+    """Iterates over (time, frame) pairs decoded directly from 
+    `src_video` at the given times (HH:MM:SS:MMM), so that the
+    frames can be handed to the next stage of processing without
+    being written to disk as jpgs and read back in again."""
+
+    def __init__(self, src_video, times, dimensions=None, grayscale=False):
+        self.src_video = src_video
+        self.times = times
+        self.dimensions = dimensions
+        self.grayscale = grayscale
+
+    def __len__(self):
+        return len(self.times)
+
+    def select(self, times):
+        """returns a VideoFrames that decodes only the given `times`
+        (e.g. those of its frames that have not been processed yet)."""
+        return VideoFrames(self.src_video, times, self.dimensions, self.grayscale)
+
+    def __iter__(self):
+        for time, frame in stream_frames(self.src_video, self.times):
+            if self.dimensions:
+                frame = resize_frame(frame, self.dimensions)
+            if self.grayscale:
+                frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            yield (time, frame)
+
+class DirectoryFrames:
+    """Iterates over (time, frame) pairs read from the jpgs 
+    stored in `image_dir` (in time order).  This provides the
+    same interface as VideoFrames for stages that have already
+    been saved to disk."""
+
+    def __init__(self, image_dir, grayscale=False):
+        self.img_paths = sorted(get_img_paths_in_dir(image_dir))
+        self.grayscale = grayscale
+
+    def __len__(self):
+        return len(self.img_paths)
+
+    def __iter__(self):
+        flags = cv2.IMREAD_GRAYSCALE if self.grayscale else cv2.IMREAD_COLOR
+        for img_path in self.img_paths:
+            yield (get_time_from_path(img_path), cv2.imread(img_path, flags))
+
+class SavedFrames:
+    """Passes the (time, frame) pairs of `frames` through unchanged, 
+    saving a copy of each frame in `output` along the way.  This 
+    is an optional sink for when the frames are needed on disk
+    as well as in memory."""
+
+    def __init__(self, frames, output, stage_id):
+        self.frames = frames
+        self.output = output
+        self.stage_id = stage_id
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __iter__(self):
+        for time, frame in self.frames:
+            save_frame(frame, self.output, self.stage_id, time)
+            yield (time, frame)
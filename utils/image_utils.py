@@ -9,11 +9,27 @@ import scipy.ndimage as ndimage
 SIGN_WIDTH = 52
 SIGN_HEIGHT = 18
 
+# geometry of the matplotlib figure that the digit region is
+# rendered into before thresholding, measured from the reference 
+# figure ocr/data/test_figures/current_fig.jpg: the 52 pixel wide 
+# region fills the 167 pixel wide axes of a figure saved at 75 dpi,
+# with white margins of 15, 3, 0 and 14 pixels (left, top, right,
+# bottom) left by the tight bounding box
+FIGURE_DPI = 75
+AXES_FRACTION = (0.775, 0.8)
+FIGURE_MARGINS = (15, 3, 0, 14)
+GREYS_R = (0, 37, 82, 115, 150, 189, 217, 240, 255)
+
 def apply_threshold_to_image(path):
     """apply a uniform threshold to convert the image located at
     `path` to binary.  he binary image is then inverted to help 
     with contour detection."""
     img = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+    return threshold_image(img)
+
+def threshold_image(img):
+    """apply a uniform threshold to convert the grayscale `img`
+    to binary, inverted to help with contour detection."""
     img = ndimage.gaussian_filter(img, sigma=1)
     ret, binary_img = cv2.threshold(img, 202, 255, cv2.THRESH_BINARY)
     binary_img = np.invert(binary_img)
@@ -94,6 +110,63 @@ def white_divider(img, thickness=10):
     }
     return rectangle
 
+def render_scale(img):
+    """returns the factor by which `img` is magnified when it 
+    is fitted into the axes of the digit figure."""
+    fig_width, fig_height = get_fig_dimensions(SIGN_WIDTH, SIGN_HEIGHT)
+    axes_width = fig_width * AXES_FRACTION[0] * FIGURE_DPI
+    axes_height = fig_height * AXES_FRACTION[1] * FIGURE_DPI
+    return min(axes_width / img.shape[1], axes_height / img.shape[0])
+
+def draw_rectangle(canvas, rectangle, scale):
+    """draws the outline described by `rectangle` (in the format 
+    returned by `border_rectangle`) onto `canvas`, an image that 
+    was magnified by `scale`. The outline is clipped to the canvas."""
+    color = int(rectangle['edgecolor'][1:3], 16)
+    half_width = rectangle['linewidth'] * FIGURE_DPI / 72 / 2
+    x, y = rectangle['xy']
+    x_min, y_min = (x + 0.5) * scale, (y + 0.5) * scale
+    x_max = x_min + rectangle['width'] * scale
+    y_max = y_min + rectangle['height'] * scale
+    edges = [(x_min, x_min, y_min, y_max), (x_max, x_max, y_min, y_max),
+             (x_min, x_max, y_min, y_min), (x_min, x_max, y_max, y_max)]
+    for left, right, top, bottom in edges:
+        top = max(int(round(top - half_width)), 0)
+        left = max(int(round(left - half_width)), 0)
+        bottom = int(round(bottom + half_width))
+        right = int(round(right + half_width))
+        canvas[top:bottom, left:right] = color
+    return canvas
+
+def apply_greys_colormap(img):
+    """maps the intensities of `img` onto the (reversed) grey
+    colormap used to plot the digit region, after stretching 
+    them to span its full range."""
+    img = np.float32(img)
+    low, high = img.min(), img.max()
+    if high == low:
+        return np.zeros(img.shape, np.float32)
+    lut = np.interp(np.linspace(0, 1, 256), 
+                    np.linspace(0, 1, len(GREYS_R)), GREYS_R)
+    idx = np.minimum((img - low) * (256 / (high - low)), 255)
+    return np.float32(np.round(lut[idx.astype(int)]))
+
+def render_digit_region(km_img, rectangles, margins=FIGURE_MARGINS):
+    """returns an in-memory equivalent of the figure made by 
+    plotting `km_img` in greyscale, overlaying the border 
+    `rectangles` and saving it with a tight bounding box, 
+    ready for thresholding."""
+    km_img = apply_greys_colormap(km_img)
+    scale = render_scale(km_img)
+    dims = (int(km_img.shape[1] * scale), int(km_img.shape[0] * scale))
+    scaled = cv2.resize(km_img, dims, interpolation=cv2.INTER_LINEAR)
+    canvas = np.uint8(np.clip(np.round(scaled), 0, 255))
+    for rectangle in rectangles:
+        draw_rectangle(canvas, rectangle, scale)
+    left, top, right, bottom = margins
+    return cv2.copyMakeBorder(canvas, top, bottom, left, right, 
+                              cv2.BORDER_CONSTANT, value=255)
+
 def bottom_half(img):
     """returns the bounding vertices of a rectangular 
     crop frame that encompasses the lower half of
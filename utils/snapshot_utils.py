@@ -1,10 +1,21 @@
 import string
 import sys
 import subprocess
-
+import cv2
+import numpy as np
 
 from time_utils import parse_hours, parse_mins
 from time_utils import parse_seconds, parse_milliseconds
+from time_utils import time_to_milliseconds
+
+# Frames are piped out of ffmpeg as packed 8-bit bgr pixels
+# (the channel ordering used by OpenCV)
+PIXEL_FORMAT = 'bgr24'
+NUM_CHANNELS = 3
+# If consecutive requested times are further apart than this 
+# (in milliseconds), it is cheaper to start a new ffmpeg process 
+# that seeks forward than to decode all of the frames in between
+MAX_DECODE_GAP = 30000
 
 def snapshot(input, output, stage_id, time, dimensions):
     """takes snapshots of the video specified by input 
@@ -21,8 +32,104 @@ def snapshot(input, output, stage_id, time, dimensions):
                                 + ':' + str(dimensions['height']), 
                                 "-qscale:v", "2", # best jpeg quality possible
                                 "-vframes", "1",
-                                "".join((output, stage_id, '-',
-                                       standard_format_time(ffmpeg_time), '.jpg'))))
+                                snapshot_name(output, stage_id, 
+                                              standard_format_time(ffmpeg_time))))
+
+def snapshot_name(output, stage_id, time):
+    """returns the path of the snapshot of stage `stage_id` taken 
+    at `time` (HH:MM:SS:MMM) and stored in the 'output' directory."""
+    return "".join((output, str(stage_id), '-', time, '.jpg'))
+
+def resize_frame(frame, dimensions):
+    """returns a copy of the decoded frame resized to the 
+    given dimensions."""
+    size = (int(round(dimensions['width'])), int(round(dimensions['height'])))
+    return cv2.resize(frame, size, interpolation=cv2.INTER_CUBIC)
+
+def save_frame(frame, output, stage_id, time, dimensions=None):
+    """saves a decoded frame to 'output' with the same naming 
+    scheme used by `snapshot`.  If dimensions are given, the 
+    frame is resized to them first."""
+    if dimensions:
+        frame = resize_frame(frame, dimensions)
+    path = snapshot_name(output, stage_id, time)
+    cv2.imwrite(path, frame, [cv2.IMWRITE_JPEG_QUALITY, 95])
+    return path
+
+def stream_frames(input, times, fps=None, max_gap=MAX_DECODE_GAP):
+    """yields a (time, frame) pair for each of the given `times` 
+    (sorted and formatted as HH:MM:SS:MMM).  Rather than seeking 
+    separately for every time, the video is opened once for each
+    run of nearby times and decoded sequentially, so the cost is 
+    one ffmpeg process per run instead of one per frame.  Frames are
+    returned as bgr arrays with the stored (sar) dimensions of 
+    the video."""
+    if fps is None:
+        fps = get_frame_rate(input)
+    dimensions = get_frame_dims(input)
+    frame_idxs = [frame_index(time, fps) for time in times]
+    for run in split_into_runs(frame_idxs, max_gap * fps / 1000.0):
+        run_times = [times[idx] for idx in run]
+        run_frames = [frame_idxs[idx] for idx in run]
+        for pair in decode_run(input, run_times, run_frames, fps, dimensions):
+            yield pair
+
+def frame_index(time, fps):
+    """returns the index of the video frame displayed 
+    closest to `time` (HH:MM:SS:MMM)."""
+    milliseconds = time_to_milliseconds(time)
+    return int(round(milliseconds * fps / 1000.0))
+
+def split_into_runs(frame_idxs, max_gap):
+    """splits the (sorted) frame indices into runs such that no 
+    two consecutive indices in a run are more than `max_gap` frames 
+    apart.  Runs are returned as lists of positions in `frame_idxs`."""
+    runs = []
+    for idx, frame_idx in enumerate(frame_idxs):
+        if runs and frame_idx - frame_idxs[runs[-1][-1]] <= max_gap:
+            runs[-1].append(idx)
+        else:
+            runs.append([idx])
+    return runs
+
+def decode_run(input, times, frame_idxs, fps, dimensions):
+    """decodes `input` sequentially from the first frame in 
+    `frame_idxs` to the last, yielding (time, frame) pairs for 
+    the requested frames. The same frame is yielded more than 
+    once if several times fall on it."""
+    width, height = int(dimensions['width']), int(dimensions['height'])
+    frame_size = width * height * NUM_CHANNELS
+    first_idx = frame_idxs[0]
+    # seek to half a frame early so that rounding the start time 
+    # can never skip past the first requested frame
+    start = '%.3f' % (max(first_idx - 0.5, 0) / fps)
+    decode_ps = subprocess.Popen(("ffmpeg", "-v", "quiet",
+                                  "-ss", start,
+                                  "-threads", "1", # (cluster only runs single threaded)
+                                  "-i", input,
+                                  "-an",
+                                  "-f", "rawvideo",
+                                  "-pix_fmt", PIXEL_FORMAT,
+                                  "pipe:1"),
+                                  stdout=subprocess.PIPE,
+                                  bufsize=frame_size)
+    try:
+        pos = 0
+        current_idx = first_idx
+        while pos < len(frame_idxs):
+            buf = decode_ps.stdout.read(frame_size)
+            if len(buf) < frame_size:
+                break # reached the end of the video
+            frame = np.frombuffer(buf, np.uint8).reshape((height, width, NUM_CHANNELS))
+            while pos < len(frame_idxs) and frame_idxs[pos] <= current_idx:
+                yield (times[pos], frame)
+                pos = pos + 1
+            current_idx = current_idx + 1
+    finally:
+        decode_ps.stdout.close()
+        if decode_ps.poll() is None:
+            decode_ps.kill()
+        decode_ps.wait()
 
 
 def get_frame_dims(input):
@@ -49,6 +156,17 @@ def get_frame_dims(input):
     print('sar dimensions', dimensions)
     return dimensions
 
+def get_frame_rate(input):
+    """returns the average frame rate (in frames per second)
+    of the first video stream in `input`."""
+    data_msg = subprocess.check_output(("ffprobe", "-v", "quiet",
+                                        "-select_streams", "v:0",
+                                        "-show_entries", "stream=avg_frame_rate",
+                                        "-of", "default=noprint_wrappers=1:nokey=1",
+                                        input))
+    numerator, denominator = clean_msg(data_msg).split('/')
+    return float(numerator) / float(denominator)
+
 def ffmpeg_format_time(time):
     """To work with ffmpeg, we must convert time 
     formats from HH:MM:SS:MMM to HH:MM:SS.MMM
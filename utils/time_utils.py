@@ -34,7 +34,7 @@ def formatted_times_in_video(src_video):
     formatted in the form 'HH:MM:SS:MMM'"""
     duration = get_video_duration(src_video)
     seconds = time_to_seconds(duration)
-    times = [seconds_to_time(second) for second in range(seconds)]
+    times = format_milliseconds(1000 * np.arange(seconds))
     return times
 
 def time_to_seconds(duration):
@@ -45,6 +45,82 @@ def time_to_seconds(duration):
     seconds = parse_seconds(duration) + (60 * mins) + (60 * 60 * hours)
     return seconds
 
+def time_to_milliseconds(formatted_time):
+    """returns the total number of milliseconds in a 
+    time of the format HH:MM:SS or HH:MM:SS:MMM"""
+    seconds = time_to_seconds(formatted_time)
+    milliseconds = parse_milliseconds(formatted_time) + (1000 * seconds)
+    return milliseconds
+
+def times_to_milliseconds(times):
+    """returns an integer numpy array holding the number of 
+    milliseconds in each of the given times (of the format 
+    HH:MM:SS or HH:MM:SS:MMM). The times are parsed together
+    from their characters rather than one at a time."""
+    chars = np.array(times, dtype='S12').view(np.uint8)
+    chars = chars.reshape((-1, 12)).astype(np.int64)
+    digits = chars - ord('0')
+    digits[chars == 0] = 0 # times without milliseconds are zero padded
+    hours = 10 * digits[:, 0] + digits[:, 1]
+    mins = 10 * digits[:, 3] + digits[:, 4]
+    seconds = 10 * digits[:, 6] + digits[:, 7]
+    milliseconds = 100 * digits[:, 9] + 10 * digits[:, 10] + digits[:, 11]
+    return 1000 * (3600 * hours + 60 * mins + seconds) + milliseconds
+
+def format_milliseconds(milliseconds):
+    """returns a list of times in the format HH:MM:SS:MMM 
+    produced from an array of milliseconds.  This is the 
+    point at which times are converted back to strings 
+    (e.g. for file names)."""
+    milliseconds = np.asarray(milliseconds, dtype=np.int64).ravel()
+    seconds, millis = np.divmod(milliseconds, 1000)
+    mins, secs = np.divmod(seconds, 60)
+    hours, mins = np.divmod(mins, 60)
+    fields = [np.char.zfill(hours.astype(str), 2),
+              np.char.zfill(mins.astype(str), 2),
+              np.char.zfill(secs.astype(str), 2),
+              np.char.zfill(millis.astype(str), 3)]
+    times = fields[0]
+    for field in fields[1:]:
+        times = np.char.add(np.char.add(times, ':'), field)
+    return [str(time) for time in times]
+
+def milliseconds_to_time(milliseconds):
+    """returns a time in the format HH:MM:SS:MMM produced 
+    from the given number of milliseconds"""
+    return format_milliseconds([milliseconds])[0]
+
+def expand_intervals(starts, stops, step):
+    """returns an array of the times (in milliseconds) in each of 
+    the intervals [start, stop] separated by `step` milliseconds. 
+    As with `get_times_in_interval`, the first time past the end of 
+    each interval is included."""
+    starts = np.asarray(starts, dtype=np.int64)
+    stops = np.asarray(stops, dtype=np.int64)
+    counts = np.maximum((stops - starts) // step + 1, 0) + 1
+    interval_starts = np.cumsum(counts) - counts
+    positions = np.arange(counts.sum()) - np.repeat(interval_starts, counts)
+    return np.repeat(starts, counts) + step * positions
+
+def cluster_milliseconds(milliseconds, size=5, max_offset=200):
+    """returns an array of shape (N, size) in which each row is
+    the cluster of times (in milliseconds) spread evenly over 
+    +/- `max_offset` milliseconds around the corresponding time."""
+    offsets = np.linspace(-max_offset, max_offset, size).astype(np.int64)
+    milliseconds = np.asarray(milliseconds, dtype=np.int64).reshape((-1, 1))
+    return milliseconds + offsets
+
+def find_contiguous_intervals(milliseconds, max_gap=1):
+    """given a sorted array of times (in milliseconds), returns a 
+    pair of arrays (starts, stops) holding the whole seconds (in 
+    milliseconds) that bound each run of times whose seconds differ
+    by no more than `max_gap`."""
+    seconds = np.asarray(milliseconds, dtype=np.int64) // 1000
+    breaks = np.flatnonzero(np.diff(seconds) > max_gap)
+    starts = seconds[np.concatenate(([0], breaks + 1))]
+    stops = seconds[np.concatenate((breaks, [len(seconds) - 1]))]
+    return (1000 * starts, 1000 * stops)
+
 def seconds_to_time(num_seconds):
     """returns a duration in the format HH:MM:SS:MMM
     produced from the given number of seconds"""
@@ -132,18 +208,15 @@ def offset_time(time, offset):
     offset between -999 and 999 and returns a formatted time 
     in the form `HH:MM:SS:mmm` where H = hours, M = minutes, 
     S = seconds, m = milliseconds"""
-    hours = parse_hours(time)
-    mins = parse_mins(time)
-    seconds = parse_seconds(time)
-    milliseconds = parse_milliseconds(time)
-    initial_time =  format_time(hours, mins, seconds, milliseconds)
-    formatted_time = add_milliseconds(initial_time, offset)
+    formatted_time = add_milliseconds(time, offset)
     return formatted_time
 
 def time_cluster(time, size=5, max_offset=200):
-    offsets = np.linspace(-max_offset, max_offset, size)
-    cluster = [offset_time(time, int(offset)) for offset in offsets]
-    return cluster
+    """returns a list of `size` formatted times spread evenly
+    over +/- `max_offset` milliseconds around `time`."""
+    milliseconds = time_to_milliseconds(time)
+    cluster = cluster_milliseconds([milliseconds], size, max_offset)
+    return format_milliseconds(cluster)
 
 def ensure_two_digits(num):
     """takes an int `num` between 0 and 99 returns a number 
@@ -172,22 +245,15 @@ def add_milliseconds(time, milliseconds):
     HH:MM:SS:MMM in which the given number of milliseconds
     have been added (or subtracted if milliseconds is 
     negative) to the specified time."""
-    hours = parse_hours(time)
-    mins = parse_mins(time)
-    seconds = parse_seconds(time)
-    milliseconds = parse_milliseconds(time) + milliseconds
-    time = format_time(hours, mins, seconds, milliseconds)
-    return time
+    milliseconds = time_to_milliseconds(time) + milliseconds
+    return milliseconds_to_time(milliseconds)
 
 def get_times_in_interval(interval, step):
     """returns a list of times in the given interval 
     separated by the number of milliseconds specified
     by 'step'."""
-    current_time = interval[0]
-    times = [current_time]
-    while current_time <= interval[1]:
-        current_time = add_milliseconds(current_time, step)
-        times.append(current_time)
+    start, stop = times_to_milliseconds(interval)
+    times = format_milliseconds(expand_intervals([start], [stop], step))
     return times
 
 def get_contiguous_intervals(times):
@@ -197,21 +263,9 @@ def get_contiguous_intervals(times):
     a contiguous time interval in 'times'."""
     if not times:
         return None
-    head = tail = time_to_seconds(times[0])
-    intervals = []
-    idx = 1
-    while idx < len(times):   
-        next_sec = time_to_seconds(times[idx])
-        if next_sec - tail > 1:
-            intervals.append((seconds_to_time(head), 
-                              seconds_to_time(tail)))
-            head = tail = next_sec
-        else:
-            tail = next_sec
-        idx = idx + 1
-    intervals.append((seconds_to_time(head), 
-                      seconds_to_time(tail)))
-    return intervals
+    starts, stops = find_contiguous_intervals(times_to_milliseconds(times))
+    intervals = zip(format_milliseconds(starts), format_milliseconds(stops))
+    return list(intervals)
 
 def convert_to_pandas_timestamp(time):
     """returns a pandas timestamp created using